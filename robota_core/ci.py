@@ -380,7 +380,7 @@ def new_ci_server(robota_config: dict) -> Union[None, CIType]:
         return None
     ci_type = ci_server_source["type"]
 
-    logger.debug(f"Initialising {ci_type} ci server.")
+    logger.debug("Initialising {} ci server.", ci_type)
 
     if ci_server_source["type"] == 'jenkins':
         return JenkinsCIServer(ci_server_source)
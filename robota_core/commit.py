@@ -1,8 +1,7 @@
 """Objects and for describing and processing Git commits."""
 
 import datetime
-import copy
-from typing import List, Union, TYPE_CHECKING
+from typing import Dict, List, Union, TYPE_CHECKING
 
 import dateparser
 import dateutil.parser
@@ -13,12 +12,17 @@ import github.CommitComment
 import github.GithubObject
 import git
 
-from robota_core.string_processing import clean, get_link
+from robota_core.string_processing import clean, get_link, iso_string_to_datetime
 
 if TYPE_CHECKING:
     from robota_core.repository import Event
 
 
+# The `git log` format read by Commit.from_log_row. Fields are separated by \x01 as it can't
+# occur in any of them, and the message comes last since it may contain newlines.
+LOG_FORMAT = "%H%x01%an%x01%ae%x01%aI%x01%P%x01%B"
+
+
 class Commit:
     """An abstract object representing a git commit.
 
@@ -47,8 +51,12 @@ class Commit:
             self._commit_from_gitlab(commit, project_url)
         elif commit_source == "github":
             self._commit_from_github(commit)
+        elif commit_source == "github_graphql":
+            self._commit_from_github_graphql(commit)
         elif commit_source == "local":
             self.commit_from_local(commit)
+        elif commit_source == "log_row":
+            self._commit_from_log_row(commit)
         elif commit_source == "dict":
             self._commit_from_dict(commit)
         else:
@@ -57,6 +65,12 @@ class Commit:
         self.message = clean(self.raw_message)
         self.merge_commit = self._is_merge_commit()
 
+    @classmethod
+    def from_log_row(cls, row: str) -> "Commit":
+        """Create a Commit from one commit of `git log` output in LOG_FORMAT. This is much
+        faster than creating a Commit from GitPython commit objects."""
+        return cls(row, "log_row")
+
     def __hash__(self):
         return hash(self.id)
 
@@ -90,6 +104,20 @@ class Commit:
         self.url = commit.html_url
         self.link = get_link(self.url, self.short_id)
 
+    def _commit_from_github_graphql(self, commit: dict):
+        """Convert a commit returned by the GitHub GraphQL API to a RoboTA Commit."""
+        self.created_at = iso_string_to_datetime(commit["committedDate"])
+        self.id = commit["oid"]
+        self.author_name = commit["author"]["name"]
+        self.short_id = self.id[:10]
+        self.parent_ids = [parent["oid"] for parent in commit["parents"]["nodes"]]
+        self.raw_message = commit["message"]
+        self.email = commit["author"]["email"]
+        self.comments = [CommitComment(comment, "github_graphql")
+                         for comment in commit["comments"]["nodes"]]
+        self.url = commit["url"]
+        self.link = get_link(self.url, self.short_id)
+
     def _commit_from_gitlab(self, gitlab_commit: gitlab.v4.objects.ProjectCommit, project_url: str):
         """Convert a Gitlab commit to RoboTA Commit."""
         self.created_at = dateparser.parse(gitlab_commit.attributes["created_at"])
@@ -115,6 +143,13 @@ class Commit:
         self.raw_message = commit.message
         self.email = commit.author.email
 
+    def _commit_from_log_row(self, row: str):
+        (self.id, self.author_name, self.email, created_at, parent_ids,
+         self.raw_message) = row.split("\x01", 5)
+        self.created_at = datetime.datetime.fromisoformat(created_at)
+        self.short_id = self.id[:10]
+        self.parent_ids = parent_ids.split()
+
     def _commit_from_dict(self, commit: dict):
         """Used for testing, create a commit with just the ID and ID of parents."""
         self.id = commit["id"]
@@ -144,6 +179,8 @@ class CommitComment:
             self._commit_comment_from_gitlab(comment_data)
         elif source == "github":
             self._commit_comment_from_github(comment_data)
+        elif source == "github_graphql":
+            self._commit_comment_from_github_graphql(comment_data)
         else:
             raise TypeError("Unknown commit comment data type.")
 
@@ -155,6 +192,12 @@ class CommitComment:
         self.text = comment_data.body
         self.author = comment_data.user.name
 
+    def _commit_comment_from_github_graphql(self, comment_data: dict):
+        self.text = comment_data["body"]
+        # The author is null if their account has been deleted.
+        if comment_data["author"]:
+            self.author = comment_data["author"].get("name")
+
 
 class Tag:
     """A tag is a named pointer to a git commit.
@@ -162,6 +205,8 @@ class Tag:
     :ivar name: The name of the tag.
     :ivar commit_id: The id of the commit that the tag points to.
     """
+    __slots__ = ("name", "commit_id")
+
     def __init__(self, tag_data, source: str):
         self.name = ""
         self.commit_id = ""
@@ -241,28 +286,45 @@ def get_merge_commit(feature_tip: Commit, master_commits: List[Commit]) -> Union
     return feature_tip
 
 
+def _undo_tag_deletion(event: "Event", tags_by_name: Dict[str, Tag]):
+    """Add a tag that has been deleted since the date."""
+    tag_data = {"name": event.ref_name,
+                "commit_id": event.commit_id}
+    tags_by_name[event.ref_name] = Tag(tag_data, "dict")
+
+
+def _undo_tag_push(event: "Event", tags_by_name: Dict[str, Tag]):
+    """Remove a tag that has been added since the date."""
+    tag = tags_by_name.get(event.ref_name)
+    if tag is not None and tag.commit_id == event.commit_id:
+        del tags_by_name[event.ref_name]
+
+
+# The function that undoes each type of tag event. Other event types do not change tags.
+_TAG_EVENT_UNDO = {"deleted": _undo_tag_deletion,
+                   "pushed to": _undo_tag_push,
+                   "pushed new": _undo_tag_push}
+
+
 def get_tags_at_date(date: datetime.datetime, tags: List[Tag],
                      events: List["Event"]) -> List[Tag]:
-    tags = copy.deepcopy(tags)
+    """Get the tags that existed at `date` by undoing the tag events that have happened since.
+
+    :param date: The date at which to get the tags.
+    :param tags: The current tags of the repository.
+    :param events: The events of the repository, most recent first.
+    :return: The tags that existed at date.
+    """
+    # Events are undone most recent first, so for each tag the earliest event after date
+    # determines whether it existed at date. Event dates are parsed on construction so they
+    # can be compared directly. Every event is checked rather than stopping at the first one
+    # before date, so events that are not in order are still undone.
+    tags_by_name = {tag.name: tag for tag in tags}
 
     for event in events:
-        if event.date > date:
-            # Add tags that have been deleted since date.
-            if event.type == "deleted":
-                if event.ref_type == "tag":
-                    tag_data = {"name": event.ref_name,
-                                "commit_id": event.commit_id}
-                    tags.append(Tag(tag_data, "dict"))
-
-            # Remove tags that have been added since date.
-            elif event.type == "pushed to" or event.type == "pushed new":
-                if event.ref_type == "tag":
-                    tag_name = event.ref_name
-                    tag_commit = event.commit_id
-                    pointer = 0
-                    while pointer < len(tags):
-                        if tags[pointer].commit_id == tag_commit and tags[pointer].name == tag_name:
-                            del (tags[pointer])
-                        else:
-                            pointer += 1
-    return tags
+        if event.date <= date or event.ref_type != "tag":
+            continue
+        undo = _TAG_EVENT_UNDO.get(event.type)
+        if undo is not None:
+            undo(event, tags_by_name)
+    return list(tags_by_name.values())
@@ -14,6 +14,12 @@ import yaml
 
 from robota_core import gitlab_tools as gitlab_tools
 
+# Use the libyaml parser if PyYAML was built with it.
+try:
+    _YAML_LOADER = yaml.CSafeLoader
+except AttributeError:
+    _YAML_LOADER = yaml.SafeLoader
+
 
 class RobotaConfigLoadError(Exception):
     """The error raised when there is a problem loading the configuration"""
@@ -187,15 +193,11 @@ def parse_config(config_path: pathlib.Path) -> dict:
     """
     config_file_type = config_path.suffix
 
-    if config_file_type in [".yaml", ".yml"]:
-        config = read_yaml_file(config_path)
-        config = process_yaml(config)
-    elif config_file_type == ".csv":
-        config = read_csv_file(config_path)
-    else:
-        raise RobotaConfigParseError(f"Cannot parse file of type: {type}.")
+    loader = _CONFIG_LOADERS.get(config_file_type)
+    if loader is None:
+        raise RobotaConfigParseError(f"Cannot parse file of type: {config_file_type}.")
 
-    return config
+    return loader(config_path)
 
 
 def read_yaml_file(config_location: pathlib.Path) -> dict:
@@ -207,13 +209,23 @@ def read_yaml_file(config_location: pathlib.Path) -> dict:
     # noinspection PyTypeChecker
     with open(config_location, encoding='utf8') as yaml_file:
         try:
-            config = yaml.load(yaml_file.read(), Loader=yaml.FullLoader)
+            config = yaml.load(yaml_file, Loader=_YAML_LOADER)
         except yaml.YAMLError as e:
             logger.error(f"YAML Parsing of file {config_location.absolute()} failed.")
             raise e
     return config
 
 
+def _parse_yaml_config(config_path: pathlib.Path) -> dict:
+    return process_yaml(read_yaml_file(config_path))
+
+
+# The function used by `parse_config` to read each type of config file, keyed by file suffix.
+_CONFIG_LOADERS = {".yaml": _parse_yaml_config,
+                   ".yml": _parse_yaml_config,
+                   ".csv": read_csv_file}
+
+
 def get_robota_config(config_path: str, substitution_vars: dict) -> dict:
     """The robota config specifies the source for each data type used by RoboTA. The RoboTA
     config is always stored locally since it contains API tokens.
@@ -227,7 +239,7 @@ def get_robota_config(config_path: str, substitution_vars: dict) -> dict:
                                                     "path": config_path.parent})[0]
     if robota_config is None:
         raise RobotaConfigLoadError(f"Unable to load robota config from {config_path.absolute()}")
-    logger.debug(f"robota-config loaded from {config_path.absolute()}")
+    logger.debug("robota-config loaded from {}", config_path.absolute())
 
     return substitute_keys(robota_config, substitution_vars)
 
@@ -260,8 +272,8 @@ def get_data_source_info(robota_config: dict, key: str) -> Union[dict, None]:
         raise RobotaConfigParseError(f"{config_error} 'data_types' section not found in "
                                      f"robota-config.")
     if key not in robota_config["data_types"]:
-        logger.debug(f"'{key}' not found in 'data_types' config section. Not initialising "
-                     f"this data source.")
+        logger.debug("'{}' not found in 'data_types' config section. Not initialising "
+                     "this data source.", key)
         return None
     data_type_info = robota_config["data_types"][key]
     if "data_source" not in data_type_info:
@@ -0,0 +1,64 @@
+"""Reading and writing the files in which RoboTA stores data between runs.
+
+The files are pickled, and unpickling a file can run arbitrary code, so a cache directory must
+only be writable by the user running RoboTA.
+"""
+import datetime
+import os
+import pathlib
+import pickle
+import threading
+import time
+from typing import Any, Union
+
+from loguru import logger
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+DEFAULT_MAX_AGE = datetime.timedelta(days=30)
+
+
+def read_pickle(path: pathlib.Path) -> Union[Any, None]:
+    """Read an object stored with `write_pickle`. Returns None if the file does not exist or is
+    corrupt."""
+    try:
+        with open(path, "rb") as cache_file:
+            return pickle.load(cache_file)
+    except FileNotFoundError:
+        return None
+    except (pickle.UnpicklingError, EOFError):
+        logger.warning(f"Ignoring corrupt cache file {path}.")
+        return None
+
+
+def write_pickle(path: pathlib.Path, value: Any):
+    """Store an object in a file so that it can be read by `read_pickle`."""
+    # Write to a temporary file first so a partly written file is never read. The temporary
+    # file is named by process and thread so that concurrent writers don't share one.
+    temp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(temp_path, "wb") as cache_file:
+        pickle.dump(value, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, path)
+
+
+def evict(directory: pathlib.Path, pattern: str, max_size: int = DEFAULT_MAX_SIZE,
+          max_age: datetime.timedelta = DEFAULT_MAX_AGE):
+    """Remove the files in directory matching pattern that have not been used for max_age,
+    then the least recently used files until the rest fit in max_size bytes. The modification
+    time of a file records when it was last used."""
+    oldest_allowed = time.time() - max_age.total_seconds()
+    entries = []
+    for path in directory.glob(pattern):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total_size = 0
+    for used_at, size, path in sorted(entries, reverse=True):
+        if used_at < oldest_allowed:
+            path.unlink(missing_ok=True)
+            continue
+        total_size += size
+        if total_size > max_size:
+            path.unlink(missing_ok=True)
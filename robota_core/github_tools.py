@@ -25,7 +25,8 @@ class GithubServer:
         else:
             logger.warning("No auth token provided for Github. Beware that API limits are very "
                             "low for unauthenticated users.")
-        return github.Github(token)
+        # Request the maximum page size to minimise the number of paginated API calls.
+        return github.Github(token, per_page=100)
 
     def open_github_repo(self, project_path: str) -> github.Repository.Repository:
         """Open a GitLab repo.
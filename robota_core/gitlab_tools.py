@@ -1,11 +1,18 @@
 """General methods for interfacing with GitLab via the python-Gitlab library."""
+import datetime
+import hashlib
+import os
+import pathlib
 import sys
 
 from loguru import logger
 import urllib.request
-from typing import List
+from typing import List, Union
 
 import gitlab.v4.objects
+import requests
+
+from robota_core import disk_cache
 
 
 class GitlabGroup:
@@ -28,18 +35,76 @@ class GitlabGroup:
         return member_list
 
 
+class ETagSession(requests.Session):
+    """A requests Session that stores GET responses which have an ETag and revalidates them
+    with If-None-Match when they are requested again. GitLab replies 304 Not Modified if the
+    resource has not changed, so it is not downloaded again. Responses are stored on disk so
+    they are reused between runs.
+
+    When the session is created, responses that have not been used for `max_age` are removed,
+    then the least recently used responses are removed until the rest fit in `max_size` bytes.
+    """
+    def __init__(self, cache_dir: Union[str, pathlib.Path],
+                 max_size: int = disk_cache.DEFAULT_MAX_SIZE,
+                 max_age: datetime.timedelta = disk_cache.DEFAULT_MAX_AGE):
+        super().__init__()
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.max_age = max_age
+        disk_cache.evict(self.cache_dir, "*.http", max_size, max_age)
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        if request.method != "GET":
+            return super().send(request, **kwargs)
+
+        path = self._cache_path(request)
+        cached = disk_cache.read_pickle(path)
+        if cached is not None:
+            etag, status_code, headers, content, encoding = cached
+            request.headers["If-None-Match"] = etag
+
+        response = super().send(request, **kwargs)
+
+        if response.status_code == 304 and cached is not None:
+            # The modification time of a stored response records when it was last used.
+            os.utime(path)
+            response = requests.Response()
+            response.status_code = status_code
+            response.headers.update(headers)
+            response._content = content
+            response.encoding = encoding
+            response.url = request.url
+            response.request = request
+        elif response.status_code == 200 and "ETag" in response.headers \
+                and not kwargs.get("stream"):
+            disk_cache.write_pickle(path, (response.headers["ETag"], response.status_code,
+                                           dict(response.headers), response.content,
+                                           response.encoding))
+        return response
+
+    def _cache_path(self, request: requests.PreparedRequest) -> pathlib.Path:
+        # Include the token in the key since different users may be able to see different data.
+        token = request.headers.get("PRIVATE-TOKEN") or request.headers.get("Authorization")
+        digest = hashlib.sha256(repr((request.url, token)).encode()).hexdigest()
+        return self.cache_dir / f"{digest}.http"
+
+
 class GitlabServer:
     """A connection to the Gitlab server. Contains methods for interfacing with the API. This is
     held distinct from the Repository object because it can also be used to interface with
     an Issue server."""
-    def __init__(self, url: str, token: str):
+    def __init__(self, url: str, token: str, cache_dir: Union[str, None] = None):
         """ Initialise the connection to the server, getting credentials from the credentials file.
 
         :param url: url of GitLab server
         :param token: Authentication token for gitlab server.
+        :param cache_dir: If set, a directory in which to store API responses so that unchanged
+          resources are not downloaded again by later requests or runs.
         """
         self.url = url
         self.token = token
+        self.cache_dir = cache_dir
 
         self.gitlab_connection: gitlab.Gitlab = self._open_gitlab_connection()
 
@@ -49,7 +114,8 @@ class GitlabServer:
             logger.error("Must provide an authentication token in robota config to use the "
                          "gitlab API.")
             raise KeyError()
-        server = gitlab.Gitlab(self.url, private_token=self.token)
+        session = ETagSession(self.cache_dir) if self.cache_dir else None
+        server = gitlab.Gitlab(self.url, private_token=self.token, session=session)
         try:
             server.auth()
         except gitlab.exceptions.GitlabAuthenticationError:
@@ -64,6 +130,23 @@ class GitlabServer:
 
         return server
 
+    def graphql(self, query: str, variables: dict = None) -> dict:
+        """Run a query against the GitLab GraphQL API. This can fetch data that would take many
+        requests to the REST API in a single request.
+
+        :param query: The GraphQL query.
+        :param variables: Values for any variables used in the query.
+        :return: The data returned by the query.
+        """
+        graphql_url = f"{self.gitlab_connection.url.rstrip('/')}/api/graphql"
+        response = self.gitlab_connection.http_post(graphql_url,
+                                                    post_data={"query": query,
+                                                               "variables": variables or {}})
+        if response.get("errors"):
+            messages = "; ".join(error["message"] for error in response["errors"])
+            raise gitlab.exceptions.GitlabGetError(f"GraphQL query failed: {messages}")
+        return response["data"]
+
     def open_gitlab_project(self, project_path: str) -> gitlab.v4.objects.Project:
         """Open a GitLab project.
 
@@ -1,8 +1,9 @@
 """Objects and for describing and processing Git Issues."""
 from abc import abstractmethod
 import datetime
+import functools
 from operator import attrgetter
-from typing import List, Union, Tuple
+from typing import Dict, List, Union, Tuple
 import re
 
 import github.Issue
@@ -12,7 +13,24 @@ from loguru import logger
 
 from robota_core import gitlab_tools, config_readers
 from robota_core.github_tools import GithubServer
-from robota_core.string_processing import string_to_datetime, get_link, clean
+from robota_core.string_processing import string_to_datetime, iso_string_to_datetime, get_link, \
+    clean
+
+
+# Strings we're searching for are:
+# - key_phrase @username
+# - key_phrase https://gitlab.cs.man.ac.uk/username
+# - key_phrase https://gitlab.cs.man.ac.uk/user.name
+# - key_phrase https://gitlab.cs.man.ac.uk/user-name
+# Also permit the team member to be quoted or in angle brackets
+# Also permit the url to be in square brackets as this is markdown for a link
+_TEAM_MEMBER_REGEX = r"\s*(<|\"|\'|\[)*(@|https:\/\/gitlab\.cs\.man\.ac\.uk\/)(\w+[-\.]?\w*)(>|\"|\'|\])*"
+
+
+@functools.lru_cache(maxsize=32)
+def _team_member_pattern(key_phrase: str) -> re.Pattern:
+    """Compile the pattern matching a team member recorded with key_phrase."""
+    return re.compile(key_phrase + _TEAM_MEMBER_REGEX)
 
 
 class Issue:
@@ -115,17 +133,26 @@ class Issue:
         self.url = gitlab_issue.attributes["web_url"]
         self.number = gitlab_issue.attributes["iid"]
         if get_comments:
-            all_notes = gitlab_issue.notes.list(all=True)
-            for note in all_notes:
-                self.comments.append(IssueComment(note, "gitlab"))
-
-            # Convert the issue state events into comments (since GitLab now handles these events separately
-            # and does not create a comment on the issue when its state changes.
-            all_state_events = gitlab_issue.resourcestateevents.list(all=True)
-            for state_change in all_state_events:
-                state_change_occurred_at = string_to_datetime(state_change.created_at)
-                note = (state_change.state, state_change_occurred_at, state_change_occurred_at, True, state_change.user["username"])
-                self.comments.append(IssueComment(note, "test data"))
+            self.add_gitlab_comments(gitlab_issue, gitlab_issue.notes.list(all=True), "gitlab")
+
+    def add_gitlab_comments(self, gitlab_issue: ProjectIssue, notes: list, note_source: str):
+        """Add the notes and state change events of a GitLab issue to the issue comments.
+
+        :param gitlab_issue: The GitLab issue the notes belong to.
+        :param notes: The notes of the issue.
+        :param note_source: The IssueComment source of the notes, 'gitlab' for python-gitlab
+          notes or 'gitlab_graphql' for notes returned by the GraphQL API.
+        """
+        self.comments.extend(IssueComment(note, note_source) for note in notes)
+
+        # Convert the issue state events into comments (since GitLab now handles these events separately
+        # and does not create a comment on the issue when its state changes.
+        all_state_events = gitlab_issue.resourcestateevents.list(all=True)
+        for state_change in all_state_events:
+            state_change_occurred_at = string_to_datetime(state_change.created_at)
+            self.comments.append(IssueComment._make(state_change.state, state_change_occurred_at,
+                                                    state_change_occurred_at, True,
+                                                    state_change.user["username"]))
 
         # Returns comments in descending order of creation date (oldest first)
         self.comments.sort(key=attrgetter("created_at"))
@@ -191,13 +218,11 @@ class Issue:
         """
         # Since we can't guarantee that all Git hosting sites will return comments in the same order
         # we specifically search for the one we want
-        comments = self.comments
-
-        matching_comments = [c.created_at for c in comments if key_phrase in c.text]
-        if matching_comments:
-            matching_comments.sort(reverse=not earliest)
-            return matching_comments[0]
-        return None
+        matching_times = (c.created_at for c in self.comments
+                          if key_phrase in c.text and c.created_at is not None)
+        if earliest:
+            return min(matching_times, default=None)
+        return max(matching_times, default=None)
 
     def get_recorded_team_member(self, key_phrase: str) -> Union[None, List[str]]:
         """Report whether a team member has been recorded using a key phrase for issue.
@@ -208,21 +233,9 @@ class Issue:
         :return team_member_recorded: Str
         """
 
-        # Strings we're searching for are:
-        # - key_phrase @username
-        # - key_phrase https://gitlab.cs.man.ac.uk/username
-        # - key_phrase https://gitlab.cs.man.ac.uk/user.name
-        # - key_phrase https://gitlab.cs.man.ac.uk/user-name
-        # Also permit the team member to be quoted or in angle brackets
-        # Also permit the url to be in square brackets as this is markdown for a link
-        regex = r"\s*(<|\"|\'|\[)*(@|https:\/\/gitlab\.cs\.man\.ac\.uk\/)(\w+[-\.]?\w*)(>|\"|\'|\])*"
-        regex = key_phrase + regex
-        recorded_team_member = []
-        for comment in self.comments:
-            match = re.findall(regex, comment.text)
-            if match:
-                for match_contents in match:
-                    recorded_team_member.append(match_contents[2])
+        pattern = _team_member_pattern(key_phrase)
+        recorded_team_member = [match_contents[2] for comment in self.comments
+                                for match_contents in pattern.findall(comment.text)]
 
         if recorded_team_member:
             return recorded_team_member
@@ -343,6 +356,12 @@ class IssueServer:
 
 class GitLabIssueServer(IssueServer):
     """An IssueServer with GitLab as the server."""
+    _GRAPHQL_BATCH_SIZE = 20
+    _GRAPHQL_NOTES_QUERY = ("query($project: ID!, $iids: [String!], $first: Int!) { "
+                            "project(fullPath: $project) { issues(iids: $iids, first: $first) { "
+                            "nodes { iid notes(first: 100) { pageInfo { hasNextPage } "
+                            "nodes { body createdAt updatedAt system author { username } } "
+                            "} } } } }")
 
     def __init__(self, issue_source: dict):
         super().__init__()
@@ -350,8 +369,9 @@ class GitLabIssueServer(IssueServer):
             token = issue_source["token"]
         else:
             token = None
-        gitlab_server = gitlab_tools.GitlabServer(issue_source["url"], token)
-        self.project = gitlab_server.open_gitlab_project(issue_source["project"])
+        self.server = gitlab_tools.GitlabServer(issue_source["url"], token,
+                                                issue_source.get("cache_dir"))
+        self.project = self.server.open_gitlab_project(issue_source["project"])
 
     def _fetch_issues(self, start: datetime.datetime, end: datetime.datetime,
                       get_comments=True) -> List[Issue]:
@@ -373,7 +393,38 @@ class GitLabIssueServer(IssueServer):
         gitlab_issues = self.project.issues.list(all=True,
                                                  query_parameters=request_parameters)
 
-        return [Issue(gitlab_issue, "gitlab", get_comments) for gitlab_issue in gitlab_issues]
+        issues = [Issue(gitlab_issue, "gitlab", get_comments=False)
+                  for gitlab_issue in gitlab_issues]
+        if get_comments:
+            notes = self._fetch_notes([issue.number for issue in issues])
+            for issue, gitlab_issue in zip(issues, gitlab_issues):
+                if issue.number in notes:
+                    issue.add_gitlab_comments(gitlab_issue, notes[issue.number], "gitlab_graphql")
+                else:
+                    issue.add_gitlab_comments(gitlab_issue, gitlab_issue.notes.list(all=True),
+                                              "gitlab")
+        return issues
+
+    def _fetch_notes(self, issue_numbers: List[int]) -> Dict[int, List[dict]]:
+        """Fetch the notes of many issues with the GitLab GraphQL API, which takes one request
+        per batch of issues rather than one request per issue.
+
+        :param issue_numbers: The project specific ids (iids) of the issues.
+        :return: The notes of each issue keyed by issue number. Issues with too many notes to
+          fetch in one query are left out.
+        """
+        project_path = self.project.attributes["path_with_namespace"]
+        notes = {}
+        for batch_start in range(0, len(issue_numbers), self._GRAPHQL_BATCH_SIZE):
+            batch = [str(number) for number in
+                     issue_numbers[batch_start:batch_start + self._GRAPHQL_BATCH_SIZE]]
+            data = self.server.graphql(self._GRAPHQL_NOTES_QUERY,
+                                       {"project": project_path, "iids": batch,
+                                        "first": len(batch)})
+            for issue_data in data["project"]["issues"]["nodes"]:
+                if not issue_data["notes"]["pageInfo"]["hasNextPage"]:
+                    notes[int(issue_data["iid"])] = issue_data["notes"]["nodes"]
+        return notes
 
     def _fetch_issues_by_milestone(self, milestone_name: str) -> List[Issue]:
         """Get all gitlab issues associated with a particular milestone.
@@ -418,7 +469,11 @@ class IssueComment:
     :ivar text: (string) The content of the comment message.
     :ivar created_at: (datetime) The time a comment was made.
     :ivar updated_at: (datetime) The most recent time the content of a comment was updated.
+    :ivar system: (bool) Whether the comment was made automatically by the issue server.
+    :ivar author: (string) The username of the comment author.
     """
+    __slots__ = ("text", "created_at", "updated_at", "system", "author")
+
     def __init__(self, comment, source: str):
         self.text = None
         self.created_at = None
@@ -428,6 +483,8 @@ class IssueComment:
 
         if source == "gitlab":
             self._comment_from_gitlab(comment)
+        elif source == "gitlab_graphql":
+            self._comment_from_gitlab_graphql(comment)
         elif source == "github":
             self._comment_from_github(comment)
         elif source == "test data":
@@ -435,6 +492,19 @@ class IssueComment:
         else:
             raise TypeError(f"Unknown commit comment source: '{source}'.")
 
+    @classmethod
+    def _make(cls, text: str, created_at: datetime.datetime, updated_at: datetime.datetime,
+              system: bool, author: str) -> "IssueComment":
+        """Make a comment from values that are already processed, skipping the source
+        dispatch of __init__."""
+        comment = cls.__new__(cls)
+        comment.text = text
+        comment.created_at = created_at
+        comment.updated_at = updated_at
+        comment.system = system
+        comment.author = author
+        return comment
+
     def _comment_from_gitlab(self, comment: ProjectIssueNote):
         """Populate an instance of a comment from a GitLab note."""
         self.text = clean(comment.attributes["body"])
@@ -443,6 +513,16 @@ class IssueComment:
         self.system = comment.attributes["system"]
         self.author = comment.attributes["author"]["username"]
 
+    def _comment_from_gitlab_graphql(self, comment: dict):
+        """Populate an instance of a comment from a note returned by the GitLab GraphQL API."""
+        self.text = clean(comment["body"])
+        self.created_at = iso_string_to_datetime(comment["createdAt"])
+        self.updated_at = iso_string_to_datetime(comment["updatedAt"])
+        self.system = comment["system"]
+        # The author is null if their account has been deleted.
+        if comment["author"]:
+            self.author = comment["author"]["username"]
+
     def _comment_from_github(self, comment: github.IssueComment):
         self.text = comment.body
         self.created_at = comment.created_at
@@ -477,7 +557,7 @@ def new_issue_server(robota_config: dict) -> Union[None, IssueServer]:
     if not issue_server_source:
         return None
     server_type = issue_server_source["type"]
-    logger.debug(f"Initialising {server_type} issue server.")
+    logger.debug("Initialising {} issue server.", server_type)
 
     if server_type == 'gitlab':
         return GitLabIssueServer(issue_server_source)
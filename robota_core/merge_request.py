@@ -1,17 +1,27 @@
 import datetime
-from typing import List, Union
+from functools import cached_property
+import pathlib
+import pickle
+import sqlite3
+import time
+from typing import Dict, List, Union
 
 import gitlab
 import github.PullRequest
 import github.PullRequestComment
 import github.IssueComment
 
-from robota_core.string_processing import markdownify, clean, string_to_datetime, get_link
+from robota_core.string_processing import markdownify, clean, iso_string_to_datetime, get_link
 
 
 class MergeRequest:
-    """A Merge Request"""
-    def __init__(self, merge_request, source: str):
+    """A Merge Request
+
+    :ivar comments: (List[MergeRequestComment]) Discussion comments on the merge request. For
+      GitHub, review comments attached to lines of the diff are only included if
+      ``include_review_comments`` is True, since fetching them costs extra API calls.
+    """
+    def __init__(self, merge_request, source: str, include_review_comments: bool = False):
         self.number: Union[int, None] = None
         self.source_branch = None
         self.target_branch = None
@@ -23,20 +33,22 @@ class MergeRequest:
         if source == "gitlab":
             self._merge_request_from_gitlab(merge_request)
         elif source == "github":
-            self._merge_request_from_github(merge_request)
+            self._merge_request_from_github(merge_request, include_review_comments)
         else:
             raise TypeError("Merge request type not recognised.")
 
         self.link = get_link(self.url, self.number)
 
-    def _merge_request_from_github(self, merge_request: github.PullRequest.PullRequest):
+    def _merge_request_from_github(self, merge_request: github.PullRequest.PullRequest,
+                                   include_review_comments: bool):
         self.number = merge_request.number
         self.source_branch = merge_request.head.ref
         self.target_branch = merge_request.base.ref
         self.author = merge_request.user.name
         self.url = merge_request.html_url
         comments = list(merge_request.get_issue_comments())
-        comments.extend(merge_request.get_comments())
+        if include_review_comments:
+            comments.extend(merge_request.get_comments())
         self.comments = [MergeRequestComment(comment, "github") for comment in comments]
         self.state = merge_request.state
 
@@ -48,30 +60,127 @@ class MergeRequest:
         self.author = gl_merge_request.attributes['author']
         self.url = gl_merge_request.attributes['web_url']
         self.comments = [MergeRequestComment(note, "gitlab") for
-                         note in gl_merge_request.notes.list(get_all=True)]
+                         note in gl_merge_request.notes.list(get_all=True, per_page=100)]
         self.state = gl_merge_request.attributes['state']
 
 
 class MergeRequestCache:
     """A cache of MergeRequest objects from a specific date range."""
     def __init__(self, start: datetime.datetime, end: datetime.datetime,
-                 merge_requests: List[MergeRequest]):
+                 merge_requests: List[MergeRequest], include_review_comments: bool = False):
         self.start = start
         self.end = end
         self.merge_requests = merge_requests
+        self.include_review_comments = include_review_comments
 
     def __iter__(self):
         yield from self.merge_requests
 
+    @cached_property
+    def columns(self) -> Dict[str, tuple]:
+        """The attributes of the cached merge requests stored column-wise, for aggregating
+        over a single attribute without touching every MergeRequest,
+        e.g. ``cache.columns["state"].count("merged")``."""
+        return {name: tuple(getattr(merge_request, name) for merge_request in self.merge_requests)
+                for name in ("number", "author", "state", "source_branch", "target_branch")}
+
     def add_merge_request(self, merge_request: MergeRequest):
         """Add a MergeRequest to a MergeRequestCache."""
         self.merge_requests.append(merge_request)
+        self.__dict__.pop("columns", None)
+
+
+class MergeRequestDiskCache:
+    """A cache of merge requests stored in an SQLite database so that it persists between runs.
+
+    Entries are keyed by provider, project and date range. Only date ranges that ended more
+    than an hour ago and contain no open merge requests are stored, since the merge requests in
+    other ranges may still change. Once the stored merge requests exceed `max_size` bytes, the
+    least recently used entries are removed.
+    """
+    _FINISHED_STATES = ("closed", "merged")
+    _ACTIVE_WINDOW = datetime.timedelta(hours=1)
+
+    def __init__(self, cache_path: Union[str, pathlib.Path], provider: str, project: str,
+                 max_size: int = 256 * 1024 * 1024):
+        self.provider = provider
+        self.project = project
+        self.max_size = max_size
+        self._connection = sqlite3.connect(str(cache_path))
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS mr_cache (provider TEXT, project TEXT, "
+                "window_start REAL, window_end REAL, review_comments INTEGER, blob BLOB, "
+                "fetched_at REAL, used_at REAL, "
+                "PRIMARY KEY (provider, project, window_start, window_end, review_comments))")
+
+    def get(self, start: datetime.datetime, end: datetime.datetime,
+            include_review_comments: bool) -> Union[List[MergeRequest], None]:
+        """Get stored merge requests for a date range, or None if they are not stored."""
+        if self._is_active(end):
+            return None
+        key = self._key(start, end, include_review_comments)
+        row = self._connection.execute(
+            "SELECT blob FROM mr_cache WHERE provider = ? AND project = ? AND window_start = ? "
+            "AND window_end = ? AND review_comments = ?", key).fetchone()
+        if row is None:
+            return None
+        with self._connection:
+            self._connection.execute(
+                "UPDATE mr_cache SET used_at = ? WHERE provider = ? AND project = ? "
+                "AND window_start = ? AND window_end = ? AND review_comments = ?",
+                (time.time(), *key))
+        return pickle.loads(row[0])
+
+    def put(self, start: datetime.datetime, end: datetime.datetime,
+            include_review_comments: bool, merge_requests: List[MergeRequest]):
+        """Store the merge requests for a date range if they are no longer expected to change."""
+        if self._is_active(end):
+            return
+        if any(mr.state not in self._FINISHED_STATES for mr in merge_requests):
+            return
+        now = time.time()
+        blob = pickle.dumps(merge_requests, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO mr_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*self._key(start, end, include_review_comments), blob, now, now))
+        self._evict()
+
+    def _key(self, start: datetime.datetime, end: datetime.datetime,
+             include_review_comments: bool) -> tuple:
+        return (self.provider, self.project, start.timestamp(), end.timestamp(),
+                int(include_review_comments))
+
+    def _is_active(self, end: datetime.datetime) -> bool:
+        """Whether merge requests in a range ending at `end` could still be changing."""
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return end.timestamp() > (now - self._ACTIVE_WINDOW).timestamp()
+
+    def _evict(self):
+        """Remove the least recently used entries until the cache fits in max_size bytes."""
+        rows = self._connection.execute(
+            "SELECT rowid, length(blob) FROM mr_cache ORDER BY used_at DESC").fetchall()
+        total_size = 0
+        stale_rows = []
+        for rowid, size in rows:
+            total_size += size
+            if total_size > self.max_size:
+                stale_rows.append((rowid,))
+        if stale_rows:
+            with self._connection:
+                self._connection.executemany("DELETE FROM mr_cache WHERE rowid = ?", stale_rows)
 
 
 class MergeRequestComment:
-    """Comments on a merge request"""
+    """Comments on a merge request
+
+    :ivar raw_body: (str) The comment text as returned by the server.
+    :ivar body: (str) The comment text sanitised and converted to HTML. This is only computed
+      when first accessed.
+    """
     def __init__(self, comment, source: str):
-        self.body = None
+        self.raw_body = ""
         self.author = None
         self.created_at = None
 
@@ -84,12 +193,16 @@ class MergeRequestComment:
 
     def _comment_from_github_merge_request(self, gh_mr_note: Union[
           github.PullRequestComment.PullRequestComment, github.IssueComment.IssueComment]):
-        self.body = markdownify(clean(gh_mr_note.body))
+        self.raw_body = gh_mr_note.body
         self.author = gh_mr_note.user.name
         self.created_at = gh_mr_note.created_at
 
     def _comment_from_gitlab_merge_request(self,
                                            gl_mr_note: gitlab.v4.objects.ProjectMergeRequestNote):
-        self.body = markdownify(clean(gl_mr_note.attributes['body']))
+        self.raw_body = gl_mr_note.attributes['body']
         self.author = gl_mr_note.attributes['author']
-        self.created_at = string_to_datetime(gl_mr_note.attributes['created_at'])
+        self.created_at = iso_string_to_datetime(gl_mr_note.attributes['created_at'])
+
+    @cached_property
+    def body(self) -> str:
+        return markdownify(clean(self.raw_body))
@@ -7,38 +7,93 @@ from loguru import logger
 
 from robota_core import gitlab_tools, config_readers
 from robota_core.github_tools import GithubServer
-from robota_core.merge_request import MergeRequest, MergeRequestCache
+from robota_core.merge_request import MergeRequest, MergeRequestCache, MergeRequestDiskCache
 
 
 class RemoteProvider:
     """A remote provider is a cloud provider that a git repository can be synchronised to.
     Remote providers have some features that a basic git Repository does not including merge
     requests and teams.
+
+    :ivar _disk_cache: If a 'cache_path' is given in the provider config, merge requests from
+      past date ranges are stored on disk and reused in later runs.
     """
-    def __init__(self):
+    def __init__(self, provider_source: Union[dict, None] = None):
         self._stored_merge_requests: List[MergeRequestCache] = []
-
-    def get_merge_requests(self, start: datetime.datetime = datetime.datetime.fromtimestamp(1, datetime.timezone.utc),
-                           end: datetime.datetime = datetime.datetime.now(tz=datetime.timezone.utc)) -> List[MergeRequest]:
-        cached_merge_requests = self._get_cached_merge_requests(start, end)
-        if cached_merge_requests:
-            return cached_merge_requests.merge_requests
-
-        new_merge_requests = self._fetch_merge_requests(start, end)
-        cache = MergeRequestCache(start, end, new_merge_requests)
+        self._disk_cache: Union[MergeRequestDiskCache, None] = None
+        if provider_source and "cache_path" in provider_source:
+            self._disk_cache = MergeRequestDiskCache(provider_source["cache_path"],
+                                                     provider_source["url"],
+                                                     provider_source["project"])
+
+    def get_merge_requests(self, start: Union[datetime.datetime, None] = None,
+                           end: Union[datetime.datetime, None] = None,
+                           include_review_comments: bool = False) -> List[MergeRequest]:
+        """Get merge requests created between the start date and end date.
+
+        :param start: The start of the time window for included merge requests. Defaults to the
+          start of the epoch.
+        :param end: The end of the time window for included merge requests. Defaults to now.
+        :param include_review_comments: Whether to also download review comments made on lines
+          of the diff. These need an extra API request per merge request so are opt-in.
+        """
+        return self._get_merge_request_cache(start, end, include_review_comments).merge_requests
+
+    def get_merge_request_columns(self, start: Union[datetime.datetime, None] = None,
+                                  end: Union[datetime.datetime, None] = None,
+                                  include_review_comments: bool = False) -> Dict[str, tuple]:
+        """Get merge requests created between the start date and end date column-wise. This is
+        quicker than looping over `get_merge_requests` when aggregating a single attribute,
+        e.g. ``get_merge_request_columns()["state"].count("merged")``.
+
+        :param start: The start of the time window for included merge requests.
+        :param end: The end of the time window for included merge requests.
+        :param include_review_comments: Whether to also download review comments.
+        :returns: A dictionary of attribute name to a tuple of the value of that attribute for
+          each merge request, in the order returned by `get_merge_requests`.
+        """
+        return self._get_merge_request_cache(start, end, include_review_comments).columns
+
+    def _get_merge_request_cache(self, start: Union[datetime.datetime, None],
+                                 end: Union[datetime.datetime, None],
+                                 include_review_comments: bool) -> MergeRequestCache:
+        """Get the cache of merge requests for a date range, fetching them if needed."""
+        if start is None:
+            start = datetime.datetime.fromtimestamp(1, datetime.timezone.utc)
+        if end is None:
+            end = datetime.datetime.now(datetime.timezone.utc)
+        # Naive datetimes are taken to be in local time. Comparing in UTC means cache keys
+        # match however the caller expressed the range.
+        start = start.astimezone(datetime.timezone.utc)
+        end = end.astimezone(datetime.timezone.utc)
+
+        cached_merge_requests = self._get_cached_merge_requests(start, end,
+                                                                include_review_comments)
+        if cached_merge_requests is not None:
+            return cached_merge_requests
+
+        new_merge_requests = None
+        if self._disk_cache:
+            new_merge_requests = self._disk_cache.get(start, end, include_review_comments)
+        if new_merge_requests is None:
+            new_merge_requests = self._fetch_merge_requests(start, end, include_review_comments)
+            if self._disk_cache:
+                self._disk_cache.put(start, end, include_review_comments, new_merge_requests)
+        cache = MergeRequestCache(start, end, new_merge_requests, include_review_comments)
         self._stored_merge_requests.append(cache)
-        return new_merge_requests
+        return cache
 
     @abstractmethod
-    def _fetch_merge_requests(self, start: datetime.datetime,
-                              end: datetime.datetime) -> List[MergeRequest]:
+    def _fetch_merge_requests(self, start: datetime.datetime, end: datetime.datetime,
+                              include_review_comments: bool) -> List[MergeRequest]:
         raise NotImplementedError("Not implemented in base class")
 
-    def _get_cached_merge_requests(self, start: datetime.datetime,
-                                   end: datetime.datetime) -> Union[MergeRequestCache, None]:
+    def _get_cached_merge_requests(self, start: datetime.datetime, end: datetime.datetime,
+                                   include_review_comments: bool) -> Union[MergeRequestCache, None]:
         """Check whether merge requests with the specified start and end date are already stored."""
         for cache in self._stored_merge_requests:
-            if cache.start == start and cache.end == end:
+            if cache.start == start and cache.end == end and \
+                    cache.include_review_comments == include_review_comments:
                 return cache
         else:
             return None
@@ -56,15 +111,22 @@ class RemoteProvider:
 
 class GithubRemoteProvider(RemoteProvider):
     def __init__(self, provider_source: dict):
-        super().__init__()
+        super().__init__(provider_source)
         server = GithubServer(provider_source)
         self.repo = server.open_github_repo(provider_source["project"])
 
-    def _fetch_merge_requests(self, start: datetime.datetime,
-                              end: datetime.datetime) -> List[MergeRequest]:
-        all_pulls = self.repo.get_pulls()
-        filtered_pulls = [pull for pull in all_pulls if start < pull.created_at < end]
-        return [MergeRequest(pull, "github") for pull in filtered_pulls]
+    def _fetch_merge_requests(self, start: datetime.datetime, end: datetime.datetime,
+                              include_review_comments: bool) -> List[MergeRequest]:
+        # get_pulls only returns open pulls by default.
+        all_pulls = self.repo.get_pulls(state="all", sort="created", direction="desc")
+        merge_requests = []
+        for pull in all_pulls:
+            if pull.created_at <= start:
+                # Pulls are sorted newest first so no further pulls are in the time window.
+                break
+            if pull.created_at < end:
+                merge_requests.append(MergeRequest(pull, "github", include_review_comments))
+        return merge_requests
 
     def get_members(self) -> Dict[str, str]:
         """This method returns names and usernames of repo collaborators since github doesn't
@@ -79,24 +141,21 @@ class GithubRemoteProvider(RemoteProvider):
 
 class GitlabRemoteProvider(RemoteProvider):
     def __init__(self, provider_source: dict):
-        super().__init__()
-        if "token" in provider_source:
-            token = provider_source["token"]
-        else:
-            token = None
+        token = provider_source.get("token")
+        super().__init__(provider_source)
         server = gitlab_tools.GitlabServer(provider_source["url"], token)
         self.project = server.open_gitlab_project(provider_source["project"])
 
-        super().__init__()
-
-    def _fetch_merge_requests(self, start: datetime.datetime,
-                              end: datetime.datetime) -> List[MergeRequest]:
-        """Get merge requests within a time period"""
-        merge_requests = self.project.mergerequests.list(created_after=start, created_before=end)
+    def _fetch_merge_requests(self, start: datetime.datetime, end: datetime.datetime,
+                              include_review_comments: bool) -> List[MergeRequest]:
+        """Get merge requests within a time period. GitLab returns review comments as notes along
+        with the rest of the discussion so include_review_comments has no effect."""
+        merge_requests = self.project.mergerequests.list(created_after=start, created_before=end,
+                                                         per_page=100, iterator=True)
         return [MergeRequest(merge_request, "gitlab") for merge_request in merge_requests]
 
     def get_members(self) -> Dict[str, str]:
-        members = self.project.members.list()
+        members = self.project.members.list(get_all=True, per_page=100)
         member_names = {member.attributes['name']: member.attributes['username']
                         for member in members}
         return member_names
@@ -130,7 +189,7 @@ def new_remote_provider(robota_config: dict) -> Union[RemoteProvider, None]:
         return None
     provider_type = provider_config["type"]
 
-    logger.debug(f"Initialising {provider_type} remote provider.")
+    logger.debug("Initialising {} remote provider.", provider_type)
 
     if provider_type == "gitlab":
         return GitlabRemoteProvider(provider_config)
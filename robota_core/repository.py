@@ -1,8 +1,16 @@
+import bisect
+import copy
 import datetime
-import io
+import functools
+import hashlib
+import itertools
+import json
+import pathlib
+import re
 import sys
+from concurrent.futures import Future, ThreadPoolExecutor
 from abc import abstractmethod
-from typing import List, Union
+from typing import Callable, Dict, Iterator, List, Tuple, Union
 
 import github
 import github.Branch
@@ -12,11 +20,17 @@ import gitlab.v4.objects
 import git
 from loguru import logger
 
-from robota_core import gitlab_tools, config_readers
-from robota_core.commit import CommitCache, Tag, Commit, get_tags_at_date
+from robota_core import gitlab_tools, config_readers, disk_cache
+from robota_core.commit import CommitCache, CommitComment, Tag, Commit, get_tags_at_date, \
+    LOG_FORMAT
 from robota_core.github_tools import GithubServer
 from robota_core.string_processing import string_to_datetime
 
+_FULL_SHA = re.compile(r"[0-9a-f]{40}")
+# Part of the key of everything stored in the repository disk cache. Change this whenever the
+# attributes of Commit or Diff change so that objects pickled by older versions are not read.
+_DISK_CACHE_VERSION = 1
+
 
 class Branch:
     """An abstract object representing a git branch.
@@ -24,20 +38,30 @@ class Branch:
     :ivar id: Name of branch.
     :ivar id: Commit id that branch points to.
     """
+    __slots__ = ("name", "id")
+
     def __init__(self, branch, source: str):
-        self.name = None
-        self.id = None
-
-        if source == "gitlab":
-            self._branch_from_gitlab(branch)
-        elif source == "github":
-            self._branch_from_github(branch)
-        elif source == "dict":
-            self._branch_from_dict(branch)
-        elif source == "local":
-            self._branch_from_local(branch)
-        else:
-            TypeError("Unknown branch type.")
+        if source not in self._FROM_SOURCE:
+            raise TypeError("Unknown branch type.")
+        self._FROM_SOURCE[source](self, branch)
+
+    @classmethod
+    def from_gitlab(cls, branch: gitlab.v4.objects.ProjectBranch) -> "Branch":
+        new_branch = cls.__new__(cls)
+        new_branch._branch_from_gitlab(branch)
+        return new_branch
+
+    @classmethod
+    def from_github(cls, branch: github.Branch.Branch) -> "Branch":
+        new_branch = cls.__new__(cls)
+        new_branch._branch_from_github(branch)
+        return new_branch
+
+    @classmethod
+    def from_local(cls, branch: git.Head) -> "Branch":
+        new_branch = cls.__new__(cls)
+        new_branch._branch_from_local(branch)
+        return new_branch
 
     def _branch_from_gitlab(self, branch: gitlab.v4.objects.ProjectBranch):
         self.name = branch.attributes["name"]
@@ -55,6 +79,9 @@ class Branch:
         self.name = branch.name
         self.id = branch.commit.hexsha
 
+    _FROM_SOURCE = {"gitlab": _branch_from_gitlab, "github": _branch_from_github,
+                    "dict": _branch_from_dict, "local": _branch_from_local}
+
 
 class Event:
     """A repository event.
@@ -65,62 +92,91 @@ class Event:
     :ivar ref_name: The name of the thing the event concerns (branch name or tag name)
     :ivar commit_id: A commit id associated with ref
     """
+    __slots__ = ("date", "type", "ref_type", "ref_name", "commit_id", "commit_count")
+
     def __init__(self, event_data):
-        self.date = None
-        self.type = None
-        self.ref_type = None
-        self.ref_name = None
-        self.commit_id = None
-        self.commit_count = None
-
-        if isinstance(event_data, gitlab.v4.objects.ProjectEvent):
-            self._event_from_gitlab(event_data)
-        elif isinstance(event_data, dict):
+        if isinstance(event_data, dict):
             self._event_from_dict(event_data)
+        elif isinstance(event_data, gitlab.v4.objects.ProjectEvent):
+            self._event_from_gitlab(event_data)
+        else:
+            self._set_push_data(None, None, None, None)
+            self.date = None
+            self.type = None
+
+    @classmethod
+    def from_gitlab(cls, event_data: gitlab.v4.objects.ProjectEvent) -> "Event":
+        event = cls.__new__(cls)
+        event._event_from_gitlab(event_data)
+        return event
+
+    @classmethod
+    def from_dict(cls, event_data: dict) -> "Event":
+        event = cls.__new__(cls)
+        event._event_from_dict(event_data)
+        return event
+
+    def _set_push_data(self, ref_type, ref_name, commit_id, commit_count):
+        self.ref_type = ref_type
+        self.ref_name = ref_name
+        self.commit_id = commit_id
+        self.commit_count = commit_count
 
     def _event_from_gitlab(self, event_data: gitlab.v4.objects.ProjectEvent):
         self.date = string_to_datetime(event_data.attributes['created_at'])
-        self.type = event_data.attributes["action_name"]
+        # Event types repeat across many events so share a single copy of each.
+        self.type = sys.intern(event_data.attributes["action_name"])
 
         if "push_data" in event_data.attributes:
             push_data = event_data.attributes['push_data']
-            self.ref_type = push_data['ref_type']
-            self.ref_name = push_data['ref']
-            self.commit_count = push_data['commit_count']
             if self.type == "deleted":
-                self.commit_id = push_data['commit_from']
+                commit_id = push_data['commit_from']
             else:
-                self.commit_id = push_data['commit_to']
+                commit_id = push_data['commit_to']
+            self._set_push_data(push_data['ref_type'], push_data['ref'], commit_id,
+                                push_data['commit_count'])
+        else:
+            self._set_push_data(None, None, None, None)
 
     def _event_from_dict(self, event_data: dict):
         self.date = string_to_datetime(event_data['date'])
-        self.type = event_data["type"]
+        self.type = sys.intern(event_data["type"])
 
         if "push_data" in event_data:
             push_data = event_data['push_data']
-            self.ref_type = push_data['ref_type']
-            self.ref_name = push_data['ref_name']
-            self.commit_id = push_data['commit_id']
-            self.commit_count = push_data['commit_count']
+            self._set_push_data(push_data['ref_type'], push_data['ref_name'],
+                                push_data['commit_id'], push_data['commit_count'])
+        else:
+            self._set_push_data(None, None, None, None)
 
 
 class Diff:
     """A representation of a git diff between two points in time for a single
     file in a git repository."""
+    __slots__ = ("old_path", "new_path", "new_file", "diff")
+
     def __init__(self, diff_info, diff_source: str):
-        self.old_path: str
-        self.new_path: str
-        self.new_file: bool
-        self.diff: str
-
-        if diff_source == "gitlab":
-            self._diff_from_gitlab(diff_info)
-        elif diff_source == "github":
-            self._diff_from_github(diff_info)
-        elif diff_source == "local_repo":
-            self._diff_from_local(diff_info)
-        else:
+        if diff_source not in self._FROM_SOURCE:
             raise TypeError(f"Unknown diff source: '{diff_source}'")
+        self._FROM_SOURCE[diff_source](self, diff_info)
+
+    @classmethod
+    def from_gitlab(cls, diff_info: dict) -> "Diff":
+        diff = cls.__new__(cls)
+        diff._diff_from_gitlab(diff_info)
+        return diff
+
+    @classmethod
+    def from_github(cls, diff_info: github.File.File) -> "Diff":
+        diff = cls.__new__(cls)
+        diff._diff_from_github(diff_info)
+        return diff
+
+    @classmethod
+    def from_local(cls, diff_info: git.Diff) -> "Diff":
+        diff = cls.__new__(cls)
+        diff._diff_from_local(diff_info)
+        return diff
 
     def _diff_from_gitlab(self, diff_info: dict):
         """Populate a diff using the dictionary of diff information returned by gitlab."""
@@ -147,23 +203,45 @@ class Diff:
             self.new_file = False
         self.diff = diff_info.patch
 
+    _FROM_SOURCE = {"gitlab": _diff_from_gitlab, "github": _diff_from_github,
+                    "local_repo": _diff_from_local}
+
 
 class Repository:
     """A place where commits, tags, events, branches and files come from.
 
     :ivar _branches: A list of Branches associated with this repository.
+    :ivar _branch_index: The Branches in _branches indexed by name.
     :ivar _events: A list of Events associated with this repository.
     :ivar _diffs: A dictionary of cached diffs associated with this repository. They are labelled
-      in the form key = point_1 + point_2 where point_1 and point_2 are the commit SHAs or branch
+      in the form key = (point_1, point_2) where point_1 and point_2 are the commit SHAs or branch
       names that the diff describes.
+    :ivar _cache_dir: If set, a directory in which commits from past time windows and diffs
+      between commit SHAs are stored so that they can be reused between runs. Old and least
+      recently used files are removed when the repository is created.
     """
-    def __init__(self, project_url: str):
+    def __init__(self, project_url: str, cache_dir: Union[str, None] = None):
         self._branches: Union[None, List[Branch]] = None
+        self._branch_index: Dict[str, Branch] = {}
         self._events: List[Event] = []
-        self._diffs = {}
-        self._stored_commits: List[CommitCache] = []
+        self._diffs: Dict[Tuple[str, str], List[Diff]] = {}
+        self._stored_commits: Dict[Tuple[Union[datetime.datetime, None],
+                                          Union[datetime.datetime, None],
+                                          Union[str, None]], CommitCache] = {}
+        self._commit_by_id: Dict[str, Commit] = {}
+        self._sorted_commit_ids: List[str] = []
         self._tags: List[Tag] = []
+        self._tag_index: Dict[str, Tag] = {}
         self.project_url = project_url
+        self._cache_dir: Union[pathlib.Path, None] = None
+        if cache_dir:
+            self._cache_dir = pathlib.Path(cache_dir)
+            self._cache_dir.mkdir(parents=True, exist_ok=True)
+            disk_cache.evict(self._cache_dir, "*.pkl")
+
+        # Created by prefetch and shut down once the prefetched data has been collected.
+        self._executor: Union[ThreadPoolExecutor, None] = None
+        self._prefetched: Dict[str, Future] = {}
 
     @abstractmethod
     def list_files(self, identifier: str) -> List[str]:
@@ -171,20 +249,51 @@ class Repository:
         commit or branch name. File paths are relative to the repository root."""
         raise NotImplementedError("Not implemented in base class.")
 
+    def iter_files(self, identifier: str) -> Iterator[str]:
+        """Iterate over the file paths in a repository, as returned by `list_files`. Use this
+        instead of `list_files` if the full list is not needed."""
+        yield from self.list_files(identifier)
+
+    def prefetch(self):
+        """Start fetching the branches and tags of the repository in the background so that
+        they are fetched concurrently rather than one after the other when first needed.
+        This must be called from the thread that uses the repository."""
+        fetches = {}
+        if not self._branches and "branches" not in self._prefetched:
+            fetches["branches"] = self._fetch_branches
+        if not self._tags and "tags" not in self._prefetched:
+            fetches["tags"] = self._fetch_tags
+        if not fetches:
+            return
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=2)
+        for name, fetch in fetches.items():
+            self._prefetched[name] = self._executor.submit(fetch)
+
+    def _get_prefetched(self, name: str, fetch: Callable[[], list]) -> list:
+        """Get the result of a fetch started by `prefetch`, or fetch now if none was started."""
+        future = self._prefetched.pop(name, None)
+        if future is None:
+            return fetch()
+        try:
+            return future.result()
+        finally:
+            if not self._prefetched:
+                # Everything prefetched has been collected so the threads are no longer needed.
+                self._executor.shutdown()
+                self._executor = None
+
     def get_branches(self) -> List[Branch]:
         """Get all of the Branches in the repository."""
         if not self._branches:
-            self._branches = self._fetch_branches()
+            self._branches = self._get_prefetched("branches", self._fetch_branches)
+            self._branch_index = {branch.name: branch for branch in self._branches}
         return self._branches
 
     def get_branch(self, name: str) -> Union[Branch, None]:
         """Get a Branch from the repository by name. If Branch does not exist, return None."""
-        if not self._branches:
-            self._branches = self._fetch_branches()
-        for branch in self._branches:
-            if branch.name == name:
-                return branch
-        return None
+        self.get_branches()
+        return self._branch_index.get(name)
 
     @abstractmethod
     def _fetch_branches(self) -> List[Branch]:
@@ -202,11 +311,29 @@ class Repository:
         explode for other file types."""
         raise NotImplementedError("Not implemented in base class.")
 
-    @abstractmethod
     def compare(self, point_1: str, point_2: str) -> List[Diff]:
         """Compare the state of the repository at two points in time.
         The points may be branch names, tags or commit ids.
         """
+        key = (point_1, point_2)
+        robota_diffs = self._diffs.get(key)
+        if robota_diffs is not None:
+            return robota_diffs
+
+        # A diff between two commit SHAs can never change so can be reused between runs.
+        immutable = bool(_FULL_SHA.fullmatch(point_1) and _FULL_SHA.fullmatch(point_2))
+        if immutable:
+            robota_diffs = self._read_disk_cache(("diffs", point_1, point_2))
+        if robota_diffs is None:
+            robota_diffs = self._fetch_diffs(point_1, point_2)
+            if immutable:
+                self._write_disk_cache(("diffs", point_1, point_2), robota_diffs)
+        self._diffs[key] = robota_diffs
+        return robota_diffs
+
+    @abstractmethod
+    def _fetch_diffs(self, point_1: str, point_2: str) -> List[Diff]:
+        """Fetch the diffs between two points in the repository from the server."""
         raise NotImplementedError("Not implemented in base class.")
 
     def get_commits(self, start: datetime.datetime = None, end: datetime.datetime = None,
@@ -216,33 +343,107 @@ class Repository:
         if cached_commits:
             return list(cached_commits.commits)
 
-        new_commits = self._fetch_commits(start, end, branch)
-        self._stored_commits.append(CommitCache(start, end, branch, new_commits))
+        # Commits in a time window that has passed can be reused between runs, but only while
+        # the branch head is unchanged. Commits are often pushed some time after they are made,
+        # so a branch can gain commits dated within a window that has already passed.
+        head = None
+        if self._cache_dir is not None and end is not None:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            if end.astimezone(datetime.timezone.utc) < now - datetime.timedelta(hours=1):
+                head = self._get_head_sha(branch)
+        new_commits = None
+        if head:
+            new_commits = self._read_disk_cache(("commits", start, end, head))
+            # Comments can be added to a commit at any time, so they are not stored.
+            for commit in new_commits or []:
+                commit.comments = self._fetch_commit_comments(commit.id)
+        if new_commits is None:
+            new_commits = self._fetch_commits(start, end, branch)
+            if head:
+                stored_commits = [copy.copy(commit) for commit in new_commits]
+                for commit in stored_commits:
+                    commit.comments = []
+                self._write_disk_cache(("commits", start, end, head), stored_commits)
+        self._stored_commits[(start, end, branch)] = CommitCache(start, end, branch, new_commits)
+        self._index_commits(new_commits)
         return new_commits
 
+    def _get_head_sha(self, branch: Union[str, None]) -> Union[str, None]:
+        """Get the SHA of the commit that `branch` points to. Returns None if branch is None
+        (all branches) or is not the name of a branch or a full commit SHA."""
+        if branch is None:
+            return None
+        if _FULL_SHA.fullmatch(branch):
+            return branch
+        named_branch = self.get_branch(branch)
+        if named_branch is None:
+            return None
+        return named_branch.id
+
     def get_commit_by_id(self, commit_id: str) -> Union[Commit, None]:
         """Get a Commit by its unique ID number"""
         if commit_id is None:
             return None
 
-        for cache in self._stored_commits:
-            for commit in cache:
-                if commit.id.startswith(commit_id):
-                    return commit
+        cached_commit = self._get_cached_commit_by_id(commit_id)
+        if cached_commit:
+            return cached_commit
 
         new_commit = self._fetch_commit_by_id(commit_id)
-
-        # Add the new commit to a cache of its own.
-        fake_date = datetime.datetime.fromtimestamp(1, datetime.timezone.utc)
-        new_cache = CommitCache(fake_date, fake_date, "", [new_commit])
-        self._stored_commits.append(new_cache)
+        if new_commit:
+            self._index_commits([new_commit])
 
         return new_commit
 
+    def get_commits_by_ids(self, commit_ids: List[str]) -> List[Union[Commit, None]]:
+        """Get several Commits by their unique ID numbers. Commits that are not already cached
+        are fetched together where the server allows it, which is much quicker than calling
+        `get_commit_by_id` for each.
+
+        :returns: A list with the Commit for each ID in commit_ids, or None where the
+          Commit could not be found.
+        """
+        missing_ids = list(dict.fromkeys(commit_id for commit_id in commit_ids
+                                         if commit_id is not None and
+                                         not self._get_cached_commit_by_id(commit_id)))
+        fetched_commits = {}
+        if missing_ids:
+            fetched_commits = dict(zip(missing_ids, self._fetch_commits_by_ids(missing_ids)))
+            self._index_commits([commit for commit in fetched_commits.values() if commit])
+
+        return [self._get_cached_commit_by_id(commit_id) or fetched_commits.get(commit_id)
+                if commit_id is not None else None for commit_id in commit_ids]
+
+    def _get_cached_commit_by_id(self, commit_id: str) -> Union[Commit, None]:
+        """Get an already fetched Commit by its full or abbreviated SHA."""
+        if commit_id in self._commit_by_id:
+            return self._commit_by_id[commit_id]
+        # commit_id may be a short SHA. The SHAs starting with it are sorted directly after it.
+        index = bisect.bisect_left(self._sorted_commit_ids, commit_id)
+        matches = [commit_sha for commit_sha in self._sorted_commit_ids[index:index + 2]
+                   if commit_sha.startswith(commit_id)]
+        if len(matches) == 1:
+            return self._commit_by_id[matches[0]]
+        if matches:
+            # An ambiguous short SHA gives the first matching commit that was fetched.
+            return next(commit for commit in self._commit_by_id.values()
+                        if commit.id.startswith(commit_id))
+        return None
+
+    def _index_commits(self, commits: List[Commit]):
+        """Add commits to the indexes used to look up commits by SHA."""
+        new_ids = [commit.id for commit in commits if commit.id not in self._commit_by_id]
+        for commit in commits:
+            self._commit_by_id[commit.id] = commit
+        if new_ids:
+            self._sorted_commit_ids.extend(new_ids)
+            self._sorted_commit_ids.sort()
+
     def get_tags(self):
         """Get all tags from the server."""
         if not self._tags:
-            self._tags = self._fetch_tags()
+            self._tags = self._get_prefetched("tags", self._fetch_tags)
+            self._tag_index = {tag.name: tag for tag in self._tags}
         return self._tags
 
     def get_tag(self, name: str, deadline: datetime.datetime = None,
@@ -255,27 +456,46 @@ class Repository:
         :param events: Events corresponding to the repository, required if deadline is specified.
         :returns: The Tag if found else returns None.
         """
-        if not self._tags:
-            self._tags = self._fetch_tags()
-        tags_to_search = self._tags
+        self.get_tags()
+        if not deadline:
+            return self._tag_index.get(name)
 
-        if deadline:
-            if not events:
-                raise SyntaxError("Must provide list of events if deadline is specified.")
-            tags_to_search = get_tags_at_date(deadline, tags_to_search, events)
+        if not events:
+            raise SyntaxError("Must provide list of events if deadline is specified.")
+        tags_to_search = get_tags_at_date(deadline, self._tags, events)
 
         for tag in tags_to_search:
             if tag.name == name:
                 return tag
         return None
 
+    def _disk_cache_path(self, key: tuple) -> pathlib.Path:
+        full_key = (self.project_url, _DISK_CACHE_VERSION) + key
+        digest = hashlib.sha256(repr(full_key).encode()).hexdigest()
+        return self._cache_dir / f"{digest}.pkl"
+
+    def _read_disk_cache(self, key: tuple) -> Union[list, None]:
+        """Read a list of objects stored with `_write_disk_cache`. Returns None if there is no
+        disk cache or nothing is stored for key."""
+        if self._cache_dir is None:
+            return None
+        path = self._disk_cache_path(key)
+        value = disk_cache.read_pickle(path)
+        if value is not None:
+            # The modification time of a stored file records when it was last used.
+            path.touch()
+        return value
+
+    def _write_disk_cache(self, key: tuple, value: list):
+        """Store a list of objects on disk so they can be reused by later runs."""
+        if self._cache_dir is None:
+            return
+        disk_cache.write_pickle(self._disk_cache_path(key), value)
+
     def _get_cached_commits(self, start: datetime.datetime,
                             end: datetime.datetime, branch: str) -> Union[CommitCache, None]:
         """Check whether commits with the specified start, end and branch are already stored."""
-        for cache in self._stored_commits:
-            if cache.start == start and cache.end == end and cache.branch == branch:
-                return cache
-        return None
+        return self._stored_commits.get((start, end, branch))
 
     @abstractmethod
     def _fetch_tags(self) -> List[Tag]:
@@ -287,6 +507,11 @@ class Repository:
         """Fetch a single commit from the server."""
         raise NotImplementedError("Not implemented in base class.")
 
+    def _fetch_commits_by_ids(self, commit_ids: List[str]) -> List[Union[Commit, None]]:
+        """Fetch several commits from the server, returning None for any that are not found.
+        Override this where the server can return many commits in one request."""
+        return [self._fetch_commit_by_id(commit_id) for commit_id in commit_ids]
+
     @abstractmethod
     def _fetch_commits(self, start: Union[datetime.datetime, None],
                        end: Union[datetime.datetime, None],
@@ -294,47 +519,68 @@ class Repository:
         """Fetch a list of commits from the server."""
         raise NotImplementedError("Not implemented in base class.")
 
+    def _fetch_commit_comments(self, commit_id: str) -> List[CommitComment]:
+        """Fetch the comments on a commit from the server. Commits in a local repository have
+        no comments."""
+        return []
+
 
 class LocalRepository(Repository):
 
     def __init__(self, commit_source: dict):
-        super().__init__(commit_source["path"])
+        super().__init__(commit_source["path"], commit_source.get("cache_dir"))
         self.repo = git.Repo(commit_source["path"])
+        # Commits resolved from refs by _get_commit. Nothing here modifies the repository so
+        # these never need invalidating.
+        self._ref_cache: Dict[str, git.Commit] = {}
+        # The branches and tags of the repository by name, built when first needed.
+        self._named_refs: Union[Dict[str, git.Reference], None] = None
+
+    def prefetch(self):
+        """GitPython objects can't safely be shared between threads, and reading a local
+        repository is fast, so nothing is fetched in advance."""
 
     def list_files(self, identifier: str) -> List[str]:
-        files = self.repo.tree(identifier).traverse()
-        file_paths = [file.path for file in files if file.type == "blob"]
+        # Listing the tree with git is much faster than traversing GitPython tree objects.
+        # Each entry has the form "<mode> <type> <object>\t<path>".
+        entries = self.repo.git.ls_tree("-r", "-z", identifier).split("\0")
+        file_paths = [path for info, path in (entry.split("\t", 1) for entry in entries if entry)
+                      if info.split(" ")[1] == "blob"]
         return file_paths
 
     def get_file_contents(self, file_path: str, branch: str = "master") -> Union[bytes, None]:
         file = self.repo.heads[branch].commit.tree / file_path
+        return file.data_stream.read()
 
-        with io.BytesIO(file.data_stream.read()) as f:
-            return f.read()
-
-    def compare(self, point_1: str, point_2: str) -> List[Diff]:
+    def _fetch_diffs(self, point_1: str, point_2: str) -> List[Diff]:
         commit_1 = self._get_commit(point_1)
         commit_2 = self._get_commit(point_2)
         diffs = commit_1.diff(commit_2, create_patch=True)
-        robota_diffs = [Diff(diff, "local_repo") for diff in diffs]
+        robota_diffs = [Diff.from_local(diff) for diff in diffs]
         return robota_diffs
 
     def _get_commit(self, ref: str) -> git.Commit:
         """Get a commit object from a ref which is a branch, tag or commit SHA."""
-        try:
-            commit = self.repo.heads[ref].commit
-            return commit
-        except IndexError:
-            pass
-        try:
-            commit = self.repo.tags[ref].commit
+        commit = self._ref_cache.get(ref)
+        if commit is not None:
             return commit
-        except IndexError:
-            pass
+        commit = self._resolve_ref(ref)
+        self._ref_cache[ref] = commit
+        return commit
+
+    def _resolve_ref(self, ref: str) -> git.Commit:
+        if self._named_refs is None:
+            # Add branches last so that they take precedence over tags of the same name.
+            # Only the matching ref is resolved to a commit, since a tag may point to a blob
+            # or tree rather than a commit.
+            self._named_refs = {tag.name: tag for tag in self.repo.tags}
+            self._named_refs.update({head.name: head for head in self.repo.heads})
+        named_ref = self._named_refs.get(ref)
         try:
-            commit = self.repo.commit(ref)
-            return commit
-        except IndexError:
+            if named_ref is not None:
+                return named_ref.commit
+            return self.repo.commit(ref)
+        except (IndexError, ValueError, git.exc.BadName):
             logger.error(f"Can't find object {ref} in Local repository. Object must be branch name,"
                          f"tag or commit SHA.")
             sys.exit(1)
@@ -344,21 +590,20 @@ class LocalRepository(Repository):
         raise NotImplementedError("Get events not implemented for LocalRepository")
 
     def _fetch_branches(self) -> List[Branch]:
-        return [Branch(branch, "local") for branch in self.repo.branches]
+        return [Branch.from_local(branch) for branch in self.repo.branches]
 
     def _fetch_commits(self, start: Union[datetime.datetime, None],
                        end: Union[datetime.datetime, None],
                        branch: Union[str, None]) -> List[Commit]:
-        rev_list_args = {}
+        # Parsing git log output directly avoids building a GitPython object for every commit.
+        log_args = ["-z", f"--format={LOG_FORMAT}"]
         if start:
-            rev_list_args["since"] = start.isoformat()
+            log_args.append(f"--since={start.isoformat()}")
         if end:
-            rev_list_args["until"] = end.isoformat()
-        rev = None
-        if branch:
-            rev = branch
-        commits = self.repo.iter_commits(rev, "", **rev_list_args)
-        return [Commit(commit, "local") for commit in commits]
+            log_args.append(f"--until={end.isoformat()}")
+        log_args.append(branch or "HEAD")
+        log = self.repo.git.log(*log_args, "--", strip_newline_in_stdout=False)
+        return [Commit.from_log_row(row) for row in log.split("\0") if row]
 
     def _fetch_commit_by_id(self, commit_id: str) -> Union[Commit, None]:
         return Commit(self.repo.commit(commit_id), "local")
@@ -368,18 +613,26 @@ class LocalRepository(Repository):
 
 
 class GithubRepository(Repository):
+    _GRAPHQL_BATCH_SIZE = 50
+    _GRAPHQL_COMMIT_FIELDS = ("oid message committedDate url author { name email } "
+                              "parents(first: 100) { nodes { oid } } "
+                              "comments(first: 100) { nodes { body "
+                              "author { ... on User { name } } } }")
+
     def __init__(self, repository_source: dict):
-        super().__init__(repository_source['url'])
+        super().__init__(repository_source['url'], repository_source.get("cache_dir"))
         server = GithubServer(repository_source)
         self.repo = server.open_github_repo(repository_source["project"])
 
     def list_files(self, identifier: str) -> List[str]:
-        files = self.repo.get_git_tree(identifier, recursive=True)
-        file_paths = [file.path for file in files.tree if file.type == "blob"]
-        return file_paths
+        return list(self.iter_files(identifier))
+
+    def iter_files(self, identifier: str) -> Iterator[str]:
+        tree = self.repo.get_git_tree(identifier, recursive=True).tree
+        return (file.path for file in tree if file.type == "blob")
 
     def _fetch_branches(self) -> List[Branch]:
-        return [Branch(branch, "github") for branch in self.repo.get_branches()]
+        return [Branch.from_github(branch) for branch in self.repo.get_branches()]
 
     def get_events(self) -> List[Event]:
         raise NotImplementedError("Method not implemented for Github Repository")
@@ -391,9 +644,9 @@ class GithubRepository(Repository):
             return None
         return file.decoded_content
 
-    def compare(self, point_1: str, point_2: str) -> List[Diff]:
+    def _fetch_diffs(self, point_1: str, point_2: str) -> List[Diff]:
         comparison = self.repo.compare(point_1, point_2)
-        return [Diff(diff, "github") for diff in comparison.files]
+        return [Diff.from_github(diff) for diff in comparison.files]
 
     def _fetch_commit_by_id(self, commit_id: str) -> Union[Commit, None]:
         try:
@@ -406,6 +659,31 @@ class GithubRepository(Repository):
 
         return Commit(commit_data, "github")
 
+    def _fetch_commits_by_ids(self, commit_ids: List[str]) -> List[Union[Commit, None]]:
+        """Fetch commits with the GitHub GraphQL API, which can return many commits from a
+        single request, unlike the REST API."""
+        owner, name = self.repo.full_name.split("/", 1)
+        commits = []
+        for batch_start in range(0, len(commit_ids), self._GRAPHQL_BATCH_SIZE):
+            batch = commit_ids[batch_start:batch_start + self._GRAPHQL_BATCH_SIZE]
+            # Each commit is requested as an aliased field of the same repository query.
+            objects = " ".join(f"c{index}: object(expression: {json.dumps(commit_id)}) "
+                               f"{{ ... on Commit {{ {self._GRAPHQL_COMMIT_FIELDS} }} }}"
+                               for index, commit_id in enumerate(batch))
+            # The repository is written into the query rather than passed as variables because
+            # some PyGithub versions nest the variables under an 'input' key.
+            query = (f"query {{ repository(owner: {json.dumps(owner)}, name: {json.dumps(name)}) "
+                     f"{{ {objects} }} }}")
+            _, response = self.repo._requester.graphql_query(query, {})
+            repository = response["data"]["repository"]
+            for index in range(len(batch)):
+                commit_data = repository[f"c{index}"]
+                if commit_data:
+                    commits.append(Commit(commit_data, "github_graphql"))
+                else:
+                    commits.append(None)
+        return commits
+
     def _fetch_commits(self, start: Union[datetime.datetime, None],
                        end: Union[datetime.datetime, None],
                        branch: Union[str, None]) -> List[Commit]:
@@ -419,6 +697,10 @@ class GithubRepository(Repository):
         github_commits = self.repo.get_commits(sha=branch, since=start, until=end)
         return [Commit(github_commit, "github") for github_commit in github_commits]
 
+    def _fetch_commit_comments(self, commit_id: str) -> List[CommitComment]:
+        comments = self.repo.get_commit(commit_id).get_comments()
+        return [CommitComment(comment, "github") for comment in comments]
+
     def _fetch_tags(self) -> List[Tag]:
         github_tags = self.repo.get_tags()
         return [Tag(github_tag, "github") for github_tag in github_tags]
@@ -435,27 +717,45 @@ class GitlabRepository(Repository):
             token = data_source["token"]
         else:
             token = None
-        server = gitlab_tools.GitlabServer(data_source["url"], token)
+        server = gitlab_tools.GitlabServer(data_source["url"], token,
+                                           data_source.get("cache_dir"))
         self.project = server.open_gitlab_project(data_source["project"])
 
-        super().__init__(self.project.attributes["web_url"])
+        super().__init__(self.project.attributes["web_url"], data_source.get("cache_dir"))
 
     def list_files(self, identifier: str) -> List[str]:
-        files = []
-        page_num = 1
-        while True:
-            file_page = self.project.repository_tree(ref=identifier, per_page=100, page=page_num,
-                                                     recursive=True)
-            if file_page:
-                files.extend(file_page)
-                page_num += 1
-            else:
-                break
+        files = self._fetch_all_pages(functools.partial(self.project.repository_tree,
+                                                        ref=identifier, recursive=True))
         file_paths = [file["path"] for file in files if file["type"] == "blob"]
         return file_paths
 
+    @staticmethod
+    def _fetch_all_pages(list_method: Callable, per_page: int = 100) -> list:
+        """Get every item from a paginated python-gitlab list method. The page count is read
+        from the first page and the remaining pages are fetched concurrently.
+
+        :param list_method: A python-gitlab method accepting the 'iterator', 'page' and
+          'per_page' keyword arguments, with any other arguments already bound.
+        :param per_page: The number of items to request per page.
+        """
+        first_page = list_method(per_page=per_page, iterator=True)
+        if first_page.total_pages is None:
+            # GitLab omits the page count for very large lists so pages must be fetched in turn.
+            return list(first_page)
+
+        # Take the first page without triggering the lazy fetch of the second.
+        items = list(itertools.islice(first_page, per_page))
+
+        def fetch_page(page_num: int) -> list:
+            return list_method(per_page=per_page, page=page_num)
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for page in executor.map(fetch_page, range(2, first_page.total_pages + 1)):
+                items.extend(page)
+        return items
+
     def _fetch_branches(self) -> List[Branch]:
-        return [Branch(branch, "gitlab") for branch in self.project.branches.list(all=True)]
+        return [Branch.from_gitlab(branch) for branch in self.project.branches.list(all=True)]
 
     def get_events(self) -> List[Event]:
         """Return a list of Events associated with this repository."""
@@ -464,7 +764,7 @@ class GitlabRepository(Repository):
             gitlab_events = self.project.events.list(all=True, action="pushed")
 
             for gitlab_event in gitlab_events:
-                self._events.append(Event(gitlab_event))
+                self._events.append(Event.from_gitlab(gitlab_event))
         return self._events
 
     def get_file_contents(self, file_path: str, branch: str = "master") -> Union[bytes, None]:
@@ -476,17 +776,10 @@ class GitlabRepository(Repository):
         else:
             return file.decode()
 
-    def compare(self, point_1: str, point_2: str) -> List[Diff]:
-        """Compare the state of the repository at two points in time.
-        The points may be branch names, tags or commit ids.
-        Point 1 must be chronologically before point 2.
-        """
-        if not point_1 + point_2 in self._diffs:
-            gitlab_diffs = self.project.repository_compare(point_1, point_2)
-            robota_diffs = [Diff(diff, "gitlab") for diff in gitlab_diffs["diffs"]]
-            self._diffs[point_1 + point_2] = robota_diffs
-
-        return self._diffs[point_1 + point_2]
+    def _fetch_diffs(self, point_1: str, point_2: str) -> List[Diff]:
+        """Point 1 must be chronologically before point 2."""
+        gitlab_diffs = self.project.repository_compare(point_1, point_2)
+        return [Diff.from_gitlab(diff) for diff in gitlab_diffs["diffs"]]
 
     def _fetch_commits(self, start: Union[datetime.datetime, None],
                        end: Union[datetime.datetime, None],
@@ -511,8 +804,8 @@ class GitlabRepository(Repository):
         else:
             request_parameters['ref_name'] = branch
 
-        gitlab_commits = self.project.commits.list(all=True,
-                                                   query_parameters=request_parameters)
+        gitlab_commits = self._fetch_all_pages(
+            functools.partial(self.project.commits.list, query_parameters=request_parameters))
 
         return [Commit(commit,  "gitlab", self.project_url) for commit in gitlab_commits]
 
@@ -524,6 +817,11 @@ class GitlabRepository(Repository):
 
         return Commit(gitlab_commit, "gitlab", self.project_url)
 
+    def _fetch_commit_comments(self, commit_id: str) -> List[CommitComment]:
+        # A lazy commit lists its comments without first requesting the commit itself.
+        comments = self.project.commits.get(commit_id, lazy=True).comments.list(all=True)
+        return [CommitComment(comment, "gitlab") for comment in comments]
+
     def _fetch_tags(self) -> List[Tag]:
         """Method for getting tags from the gitlab server."""
         gitlab_tags = self.project.tags.list(all=True)
@@ -537,7 +835,7 @@ def new_repository(robota_config: dict) -> Union[Repository, None]:
         return None
     repo_type = repo_config["type"]
 
-    logger.debug(f"Initialising {repo_type} repository.")
+    logger.debug("Initialising {} repository.", repo_type)
 
     if repo_type == "gitlab":
         return GitlabRepository(repo_config)
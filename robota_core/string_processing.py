@@ -1,9 +1,12 @@
 import datetime
+import functools
 import re
+import threading
 from typing import Union, Dict
 from zoneinfo import ZoneInfo
 
 import bleach
+import bleach.sanitizer
 import markdown
 
 
@@ -24,29 +27,94 @@ def string_to_datetime(date: Union[str, None],
     if isinstance(date, str):
         if datetime_format is None:
             datetime_format = '%Y-%m-%dT%H:%M:%S.%f%z'
-        dt = datetime.datetime.strptime(date, datetime_format)
-        if dt.tzinfo is None:
-            # Convert the naive datetime into an aware datetime in UTC
-            dt = dt.replace(tzinfo=ZoneInfo("Europe/London"))
-        return dt
+        return _parse_datetime(date, datetime_format)
     else:
         raise TypeError("Unknown date type. Cannot convert.")
 
 
+# The timestamp format used by the GitLab API. Strings of exactly this shape are parsed with
+# datetime.fromisoformat, which is much faster than strptime. Anything else is left to strptime
+# so that a format accepts the same strings whichever parser is used.
+_ISO_TIMESTAMP = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{1,6}(Z|[+-]\d{2}:?\d{2})")
+
+
+@functools.lru_cache(maxsize=8192)
+def _parse_datetime(date: str, datetime_format: str) -> datetime.datetime:
+    """Parse a time string. Many events share the same timestamp so the results are cached."""
+    dt = None
+    if datetime_format == '%Y-%m-%dT%H:%M:%S.%fZ':
+        if date.endswith("Z") and _ISO_TIMESTAMP.fullmatch(date):
+            # The format matches the 'Z' literally, so the result is a naive datetime.
+            dt = _from_iso_string(date[:-1])
+    elif datetime_format == '%Y-%m-%dT%H:%M:%S.%f%z':
+        if _ISO_TIMESTAMP.fullmatch(date):
+            dt = _from_iso_string(date)
+    if dt is None:
+        dt = datetime.datetime.strptime(date, datetime_format)
+    if dt.tzinfo is None:
+        # Convert the naive datetime into an aware datetime in UTC
+        dt = dt.replace(tzinfo=ZoneInfo("Europe/London"))
+    return dt
+
+
+def _from_iso_string(date: str) -> Union[datetime.datetime, None]:
+    """Parse an ISO 8601 time string with `datetime.fromisoformat`. Returns None if the string
+    is not in a format that fromisoformat understands."""
+    # fromisoformat only accepts a trailing 'Z' from Python 3.11.
+    if date.endswith("Z"):
+        date = date[:-1] + "+00:00"
+    try:
+        return datetime.datetime.fromisoformat(date)
+    except ValueError:
+        return None
+
+
+def iso_string_to_datetime(date: Union[str, None]) -> Union[datetime.datetime, None]:
+    """Convert an ISO 8601 time string with a UTC offset (as returned by the GitLab API) to an
+    aware datetime. This accepts any string `datetime.fromisoformat` understands, so unlike
+    `string_to_datetime` the fractional seconds are optional. Other strings are passed to
+    `string_to_datetime`.
+
+    >>> iso_string_to_datetime('2017-12-06T08:28:32.000Z')
+    datetime.datetime(2017, 12, 6, 8, 28, 32, tzinfo=datetime.timezone.utc)
+    """
+    if date is None:
+        return None
+    dt = _from_iso_string(date)
+    if dt is None:
+        return string_to_datetime(date)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=ZoneInfo("Europe/London"))
+    return dt
+
+
+# Building a markdown parser or HTML sanitiser is expensive so instances are reused. Neither is
+# thread safe, so each thread creates its own when first needed.
+_THREAD_LOCAL = threading.local()
+
+
 def markdownify(text: str) -> str:
     """Take text in markdown format and output the formatted text with HTML markup."""
-    return markdown.markdown(text, extensions=['attr_list'])
+    md = getattr(_THREAD_LOCAL, "markdown", None)
+    if md is None:
+        md = _THREAD_LOCAL.markdown = markdown.Markdown(extensions=['attr_list'])
+    return md.reset().convert(text)
 
 
 def clean(text: str) -> str:
     """Convert any HTML tags to a string representation so HTML cannot be executed."""
-    return bleach.clean(text)
+    cleaner = getattr(_THREAD_LOCAL, "cleaner", None)
+    if cleaner is None:
+        cleaner = _THREAD_LOCAL.cleaner = bleach.sanitizer.Cleaner()
+    return cleaner.clean(text)
+
+
+_NEWLINES = re.compile(r'\n+')
 
 
 def html_newlines(text: str) -> str:
     """Replace any newline characters in a string with html newline characters."""
-    html = re.sub('(\n)+', '<br>', text)
-    return html
+    return _NEWLINES.sub('<br>', text)
 
 
 def list_to_html_rows(list_of_strings: list) -> str:
@@ -55,12 +123,9 @@ def list_to_html_rows(list_of_strings: list) -> str:
 
 
 def sublist_to_html_rows(list_of_lists: list, empty='-') -> list:
-    """Separate items in a sub-list by html new lines instead of commas."""
-    for item in list_of_lists:
-        assert item is None or isinstance(item, list)
-
-    return [list_to_html_rows(list_items) if list_items else empty
-            for list_items in list_of_lists]
+    """Separate items in a sub-list by html new lines instead of commas. Each item of
+    `list_of_lists` should be a list of strings or None."""
+    return ['<br>'.join(list_items) if list_items else empty for list_items in list_of_lists]
 
 
 def get_link(url: str, link_text: Union[str, int, float]) -> str:
@@ -69,13 +134,13 @@ def get_link(url: str, link_text: Union[str, int, float]) -> str:
     return f'<a target="_parent" href="{url}">{link_text}</a>'
 
 
+_WILDCARD_TABLE = str.maketrans({".": r"\.", "*": ".+", "?": "."})
+
+
 def build_regex_string(string: str) -> str:
     """Escape some characters and replace * and ? wildcard characters with the
     python regex equivalents."""
-    string.replace(".", r"\.")
-    string.replace("*", ".+")
-    string.replace("?", ".")
-    return string
+    return string.translate(_WILDCARD_TABLE)
 
 
 def replace_none(input_list: list, replacement='-') -> list:
@@ -84,13 +149,11 @@ def replace_none(input_list: list, replacement='-') -> list:
 
 
 def append_list_to_dict(dictionary: Dict[str, list], key: str, value: list):
-    """If key exists in dictionary then append value to it, else add a new key with value.
+    """If key exists in dictionary then append value to it, else add a new key with a copy
+    of value.
 
     :param dictionary: A dictionary to add key and value to.
     :param key: Dictionary key.
     :param value: A value to append to the dictionary list.
     """
-    if key in dictionary:
-        dictionary[key].extend(value)
-    else:
-        dictionary[key] = value
+    dictionary.setdefault(key, []).extend(value)
@@ -0,0 +1,31 @@
+"""Fixtures shared between the robota_core tests."""
+import pathlib
+
+import pytest
+
+import robota_core.config_readers as config_readers
+from robota_core.issue import Issue
+
+TEST_FOLDER = pathlib.Path(__file__).parent / pathlib.Path("sample_files")
+
+
+@pytest.fixture(scope="session")
+def sample_config_path() -> pathlib.Path:
+    """The path of the sample YAML config file."""
+    return TEST_FOLDER / pathlib.Path("config.yaml")
+
+
+@pytest.fixture(scope="session")
+def sample_config(sample_config_path) -> dict:
+    """The sample YAML config file, parsed once per test session. Tests must not modify it."""
+    return config_readers.parse_config(sample_config_path)
+
+
+@pytest.fixture
+def make_issue():
+    """A factory that makes a fresh test Issue with the given list of IssueComments."""
+    def _make_issue(comments: list) -> Issue:
+        issue = Issue((1, 'GUI bug'), "test data")
+        issue.comments = comments
+        return issue
+    return _make_issue
@@ -0,0 +1,22 @@
+"""Tests for disk_cache.py"""
+from robota_core import disk_cache
+
+
+class TestPickleFiles:
+    @staticmethod
+    def test_write_then_read(tmp_path):
+        path = tmp_path / "value.pkl"
+        assert disk_cache.read_pickle(path) is None
+
+        disk_cache.write_pickle(path, [("a", 1), ("b", 2)])
+        assert disk_cache.read_pickle(path) == [("a", 1), ("b", 2)]
+        # The temporary file is replaced by the stored file.
+        assert [file.name for file in tmp_path.iterdir()] == ["value.pkl"]
+
+    @staticmethod
+    def test_corrupt_file_ignored(tmp_path):
+        path = tmp_path / "value.pkl"
+        path.write_bytes(b"")
+        assert disk_cache.read_pickle(path) is None
+        path.write_bytes(b"not a pickle")
+        assert disk_cache.read_pickle(path) is None
@@ -1,10 +1,14 @@
 """"Tests for gitlab_tools.py"""
 from datetime import datetime, timezone, timedelta
+import http.server
+import os
+import threading
+import time
 
 import gitlab
 import pytest
 
-from robota_core.gitlab_tools import GitlabServer
+from robota_core.gitlab_tools import ETagSession, GitlabServer
 from robota_core.repository import Event
 from robota_core import commit
 
@@ -20,60 +24,120 @@ class TestOpenGitlab:
             _ = GitlabServer(self.bad_url, self.bad_token)
 
 
-class TestGetTags:
-    @staticmethod
-    def test_added_tag_after_deadline():
-        # Test for the case that a branch has been added since deadline and so should be removed.
-        tags = [commit.Tag({"name": "master", "commit_id": "111"}, "dict"),
-                commit.Tag({"name": "develop", "commit_id": "222"}, "dict"),
-                commit.Tag({"name": "feature", "commit_id": "333"}, "dict")]
+def _tag_event(date: str, event_type: str) -> Event:
+    return Event({"date": date, "type": event_type,
+                  "push_data": {"ref_type": "tag", "ref_name": "feature",
+                                "commit_id": "333", "commit_count": "1"}})
 
-        events = [Event({"date": "2020-01-02T00:00:00.000Z", "type": "pushed new",
-                         "push_data": {"ref_type": "tag", "ref_name": "feature",
-                                       "commit_id": "333", "commit_count": "1"}})]
 
-        tags = commit.get_tags_at_date(datetime(2020, 1, 1, tzinfo=timezone(timedelta(hours=0))), tags, events)
-        assert isinstance(tags, list)
-        assert len(tags) == 2
-        assert tags[0].name == "master"
-        assert tags[1].name == "develop"
+_BASE_TAGS = (commit.Tag({"name": "master", "commit_id": "111"}, "dict"),
+              commit.Tag({"name": "develop", "commit_id": "222"}, "dict"))
+_FEATURE_TAG = commit.Tag({"name": "feature", "commit_id": "333"}, "dict")
 
-    @staticmethod
-    def test_deleted_tag_after_deadline():
-        # Test for the case that a branch has been deleted since deadline and so should be added.
-        tags = [commit.Tag({"name": "master", "commit_id": "111"}, "dict"),
-                commit.Tag({"name": "develop", "commit_id": "222"}, "dict")]
 
-        events = [Event({"date": "2020-01-02T00:00:00.000Z", "type": "deleted",
-                         "push_data": {"ref_type": "tag", "ref_name": "feature",
-                                       "commit_id": "333", "commit_count": "1"}})]
-
-        tags = commit.get_tags_at_date(datetime(2020, 1, 1, tzinfo=timezone(timedelta(hours=0))), tags, events)
+class TestGetTags:
+    @staticmethod
+    @pytest.mark.parametrize("tags, events, expected", [
+        # A tag has been added since deadline and so should be removed.
+        (_BASE_TAGS + (_FEATURE_TAG, ),
+         [_tag_event("2020-01-02T00:00:00.000Z", "pushed new")],
+         ["master", "develop"]),
+        # A tag has been deleted since deadline and so should be added.
+        (_BASE_TAGS,
+         [_tag_event("2020-01-02T00:00:00.000Z", "deleted")],
+         ["master", "develop", "feature"]),
+        # A tag has been added and deleted since deadline and so should not be added.
+        # Events come from gitlab most recent first.
+        (_BASE_TAGS,
+         [_tag_event("2020-01-02T00:01:00.000Z", "deleted"),
+          _tag_event("2020-01-02T00:00:00.000Z", "pushed new")],
+         ["master", "develop"]),
+        # Events before the deadline don't stop later events being undone.
+        (_BASE_TAGS + (_FEATURE_TAG, ),
+         [_tag_event("2019-12-31T00:00:00.000Z", "deleted"),
+          _tag_event("2020-01-02T00:00:00.000Z", "pushed new")],
+         ["master", "develop"]),
+    ], ids=["added_after_deadline", "deleted_after_deadline", "changed_after_deadline",
+            "unsorted_events"])
+    def test_tags_at_date(tags, events, expected):
+        tags = commit.get_tags_at_date(datetime(2020, 1, 1, tzinfo=timezone(timedelta(hours=0))),
+                                       list(tags), events)
         assert isinstance(tags, list)
-        assert len(tags) == 3
-        assert tags[0].name == "master"
-        assert tags[1].name == "develop"
-        assert tags[2].name == "feature"
-
+        assert [tag.name for tag in tags] == expected
+
+
+class _ETagHandler(http.server.BaseHTTPRequestHandler):
+    """Serves a single JSON page with an ETag, answering 304 if the client already has it."""
+    etag = '"v1"'
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.send_header("ETag", self.etag)
+            self.end_headers()
+            return
+        body = b'[{"name": "v1.0"}]'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", self.etag)
+        self.send_header("X-Total-Pages", "2")
+        self.send_header("Link", f'<http://{self.headers["Host"]}/tags?page=2>; rel="next"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def etag_server():
+    _ETagHandler.requests_seen = []
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _ETagHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/tags"
+    server.shutdown()
+    server.server_close()
+
+
+class TestETagSession:
     @staticmethod
-    def test_tag_changed_after_deadline():
-        # Test for the case that a branch has been added and deleted since deadline
-        # and so should not be added.
+    def test_unchanged_response_replayed(etag_server, tmp_path):
+        session = ETagSession(tmp_path)
+        first = session.get(etag_server, headers={"PRIVATE-TOKEN": "aaa"})
+        assert first.status_code == 200
+        assert "If-None-Match" not in _ETagHandler.requests_seen[-1]
+
+        second = session.get(etag_server, headers={"PRIVATE-TOKEN": "aaa"})
+        assert _ETagHandler.requests_seen[-1]["If-None-Match"] == '"v1"'
+        assert second.status_code == 200
+        assert second.json() == [{"name": "v1.0"}]
+        assert second.headers["X-Total-Pages"] == "2"
+        assert second.links["next"]["url"].endswith("/tags?page=2")
+
+        # A new session, as in a later run, reuses the stored response.
+        ETagSession(tmp_path).get(etag_server, headers={"PRIVATE-TOKEN": "aaa"})
+        assert _ETagHandler.requests_seen[-1]["If-None-Match"] == '"v1"'
 
-        tags = [commit.Tag({"name": "master", "commit_id": "111"}, "dict"),
-                commit.Tag({"name": "develop", "commit_id": "222"}, "dict")]
+    @staticmethod
+    def test_different_token_not_shared(etag_server, tmp_path):
+        session = ETagSession(tmp_path)
+        session.get(etag_server, headers={"PRIVATE-TOKEN": "aaa"})
+        response = session.get(etag_server, headers={"PRIVATE-TOKEN": "bbb"})
+        assert "If-None-Match" not in _ETagHandler.requests_seen[-1]
+        assert response.json() == [{"name": "v1.0"}]
 
-        # Events come from gitlab most recent first.
-        events = [Event({"date": "2020-01-02T00:01:00.000Z", "type": "deleted",
-                         "push_data": {"ref_type": "tag", "ref_name": "feature",
-                                       "commit_id": "333", "commit_count": "1"}}),
-                  Event({"date": "2020-01-02T00:00:00.000Z", "type": "pushed new",
-                         "push_data": {"ref_type": "tag", "ref_name": "feature",
-                                       "commit_id": "333", "commit_count": "1"}})
-                  ]
-
-        tags = commit.get_tags_at_date(datetime(2020, 1, 1, tzinfo=timezone(timedelta(hours=0))), tags, events)
-        assert isinstance(tags, list)
-        assert len(tags) == 2
-        assert tags[0].name == "master"
-        assert tags[1].name == "develop"
+    @staticmethod
+    def test_old_and_least_recently_used_responses_removed(tmp_path):
+        now = time.time()
+        for name, age_days in [("new", 0), ("recent", 1), ("older", 2), ("expired", 40)]:
+            path = tmp_path / f"{name}.http"
+            path.write_bytes(b"x" * 100)
+            used_at = now - age_days * 24 * 60 * 60
+            os.utime(path, (used_at, used_at))
+
+        ETagSession(tmp_path, max_size=250, max_age=timedelta(days=30))
+        assert sorted(path.stem for path in tmp_path.glob("*.http")) == ["new", "recent"]
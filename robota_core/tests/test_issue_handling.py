@@ -1,41 +1,51 @@
 # Unit and simple integration tests for functionality concerning issue handling
-from datetime import datetime, timedelta
-from unittest import TestCase
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 
-from robota_core.issue import Issue, IssueComment
+from robota_core.issue import GitLabIssueServer, IssueComment
 
 
-class TestIssueHandling(TestCase):
+class TestIssueHandling:
     @staticmethod
-    def test_fetch_earliest_matching_comment():
+    def test_fetch_earliest_matching_comment(make_issue):
         text_to_match = "changed due date to"
         first_date = datetime(2020, 1, 1, hour=12)
         one_day = timedelta(days=1)
         two_days = timedelta(days=2)
         update_date = datetime(2020, 5, 5)
-        test_issue = Issue((1, 'GUI bug'), "test data")
         author1 = "jemima.puddleduck"
         author2 = "jfisher572"
         # A list of comments in non-chronological order
-        test_issue.comments = [
+        test_issue = make_issue([
             IssueComment(("removed milestone", first_date + one_day, update_date, True, author1), "test data"),
             IssueComment((text_to_match, first_date + two_days, update_date, True, author1), "test data"),
             IssueComment(("Tests completed for this issue", first_date - one_day, update_date, False, author2), "test data"),
             IssueComment((text_to_match, first_date, update_date, True, author2), "test data"),
             IssueComment(("changed time estimate to", first_date - two_days, update_date, True, author2), "test data")
-        ]
+        ])
 
         assert test_issue.get_comment_timestamp(text_to_match, earliest=True) == first_date
         assert test_issue.get_comment_timestamp(text_to_match, earliest=False) == first_date + two_days
 
-    def test_identify_sub_team_membership_in_issue_comments(self):
+    @staticmethod
+    def test_comment_timestamp_ignores_comments_without_date(make_issue):
+        text_to_match = "changed due date to"
+        first_date = datetime(2020, 1, 1, hour=12)
+        test_issue = make_issue([
+            IssueComment((text_to_match, first_date, first_date, True, "anne.author"), "test data"),
+            IssueComment((text_to_match, None, None, True, "anne.author"), "test data")
+        ])
+        assert test_issue.get_comment_timestamp(text_to_match, earliest=True) == first_date
+        assert test_issue.get_comment_timestamp(text_to_match, earliest=False) == first_date
+
+    @staticmethod
+    def test_identify_sub_team_membership_in_issue_comments(make_issue):
         key_phrase = 'Sub team member:'
         # Set up an issue with comments covering all the key cases.
         # We don't care about the order of these comments or when they were made, so use a dummy date
-        test_issue = Issue((1, 'GUI bug'), "test data")
         dummy_date = None
         dummy_author = "anne.author"
-        test_issue.comments = [
+        test_issue = make_issue([
             # An irrelevant comment
             IssueComment(("removed milestone", dummy_date, dummy_date, True, dummy_author), "test data"),
             # An irrevelvant comment containing a username
@@ -55,8 +65,74 @@ class TestIssueHandling(TestCase):
             IssueComment((key_phrase + " [https://gitlab.cs.man.ac.uk/j45678kl]", dummy_date, None, True, dummy_author), "test data"),
             # A sub-team assignment of the form: key_phrase <https://gitlab.cs.man.ac.uk/user.name>
             IssueComment((key_phrase + " <https://gitlab.cs.man.ac.uk/m56789no>", dummy_date, None, True, dummy_author), "test data")
-        ]
+        ])
 
         actualTeamMembers = test_issue.get_recorded_team_member(key_phrase)
         expectedTeamMembers = ["d23456ef", "g34567hi", "some.one", "person-two", "j45678kl", "m56789no"]
-        self.assertCountEqual(actualTeamMembers, expectedTeamMembers)
+        assert sorted(actualTeamMembers) == sorted(expectedTeamMembers)
+
+
+class _FakeList:
+    """Stands in for a python-gitlab manager, returning fixed items from list()."""
+    def __init__(self, items: list):
+        self.items = items
+        self.list_calls = 0
+
+    def list(self, **kwargs) -> list:
+        self.list_calls += 1
+        return self.items
+
+
+def _gitlab_issue(iid: int, rest_notes: list) -> SimpleNamespace:
+    attributes = {"iid": iid, "title": f"Issue {iid}", "created_at": "2020-01-01T12:00:00.000Z",
+                  "closed_at": None, "assignee": None, "closed_by": None, "time_stats": {},
+                  "due_date": None, "milestone": None,
+                  "web_url": f"https://gitlab.example.com/team/project/-/issues/{iid}"}
+    return SimpleNamespace(attributes=attributes, state="opened", notes=_FakeList(rest_notes),
+                           resourcestateevents=_FakeList([]))
+
+
+def _graphql_note(body: str, created_at: str, author) -> dict:
+    return {"body": body, "createdAt": created_at, "updatedAt": created_at, "system": False,
+            "author": author}
+
+
+class TestGitLabIssueNotes:
+    @staticmethod
+    def test_notes_fetched_with_graphql():
+        rest_note = SimpleNamespace(attributes={
+            "body": "From REST", "created_at": "2020-01-03T12:00:00.000Z",
+            "updated_at": "2020-01-03T12:00:00.000Z", "system": False,
+            "author": {"username": "rest.user"}})
+        gitlab_issues = [_gitlab_issue(1, []), _gitlab_issue(2, [rest_note])]
+        queries = []
+
+        def graphql(query, variables):
+            queries.append(variables)
+            return {"project": {"issues": {"nodes": [
+                {"iid": "1", "notes": {"pageInfo": {"hasNextPage": False}, "nodes": [
+                    _graphql_note("Sub team member: @someone", "2020-01-02T12:00:00Z",
+                                  {"username": "anne.author"}),
+                    _graphql_note("From a deleted user", "2020-01-02T13:00:00.5+01:00", None)]}},
+                # Issue 2 has more notes than one query returns so REST is used instead.
+                {"iid": "2", "notes": {"pageInfo": {"hasNextPage": True}, "nodes": []}}]}}}
+
+        server = GitLabIssueServer.__new__(GitLabIssueServer)
+        server.server = SimpleNamespace(graphql=graphql)
+        server.project = SimpleNamespace(attributes={"path_with_namespace": "team/project"},
+                                         issues=_FakeList(gitlab_issues))
+
+        issue_1, issue_2 = server._fetch_issues(None, None, get_comments=True)
+
+        assert queries == [{"project": "team/project", "iids": ["1", "2"], "first": 2}]
+        assert [comment.text for comment in issue_1.comments] == \
+            ["Sub team member: @someone", "From a deleted user"]
+        assert [comment.author for comment in issue_1.comments] == ["anne.author", None]
+        assert issue_1.comments[0].created_at == datetime(2020, 1, 2, 12, tzinfo=timezone.utc)
+        assert issue_1.comments[1].created_at == \
+            datetime(2020, 1, 2, 12, 0, 0, 500000, tzinfo=timezone.utc)
+        assert gitlab_issues[0].notes.list_calls == 0
+
+        assert [comment.text for comment in issue_2.comments] == ["From REST"]
+        assert [comment.author for comment in issue_2.comments] == ["rest.user"]
+        assert gitlab_issues[1].notes.list_calls == 1
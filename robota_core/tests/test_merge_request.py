@@ -0,0 +1,84 @@
+"""Tests for merge_request.py"""
+from datetime import datetime, timedelta, timezone
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from robota_core import merge_request
+from robota_core.merge_request import MergeRequestDiskCache
+
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+END = datetime(2020, 2, 1, tzinfo=timezone.utc)
+
+
+def _merge_requests(state: str = "merged", count: int = 2) -> list:
+    return [SimpleNamespace(number=number, state=state) for number in range(count)]
+
+
+@pytest.fixture
+def disk_cache(tmp_path) -> MergeRequestDiskCache:
+    return MergeRequestDiskCache(tmp_path / "mr_cache.sqlite", "https://gitlab.example.com",
+                                 "team/project")
+
+
+class TestMergeRequestDiskCache:
+    @staticmethod
+    def test_put_then_get(disk_cache):
+        assert disk_cache.get(START, END, False) is None
+        disk_cache.put(START, END, False, _merge_requests())
+
+        cached = disk_cache.get(START, END, False)
+        assert [(mr.number, mr.state) for mr in cached] == [(0, "merged"), (1, "merged")]
+        assert disk_cache.get(START, END + timedelta(days=1), False) is None
+
+    @staticmethod
+    def test_persists_between_instances(disk_cache, tmp_path):
+        disk_cache.put(START, END, False, _merge_requests())
+        reopened = MergeRequestDiskCache(tmp_path / "mr_cache.sqlite",
+                                         "https://gitlab.example.com", "team/project")
+        assert len(reopened.get(START, END, False)) == 2
+        other_project = MergeRequestDiskCache(tmp_path / "mr_cache.sqlite",
+                                              "https://gitlab.example.com", "team/other")
+        assert other_project.get(START, END, False) is None
+
+    @staticmethod
+    def test_review_comments_are_part_of_key(disk_cache):
+        disk_cache.put(START, END, False, _merge_requests(count=1))
+        assert disk_cache.get(START, END, True) is None
+
+        disk_cache.put(START, END, True, _merge_requests(count=3))
+        assert len(disk_cache.get(START, END, False)) == 1
+        assert len(disk_cache.get(START, END, True)) == 3
+
+    @staticmethod
+    def test_open_merge_requests_not_stored(disk_cache):
+        disk_cache.put(START, END, False, _merge_requests() + _merge_requests("opened", 1))
+        assert disk_cache.get(START, END, False) is None
+
+    @staticmethod
+    def test_active_window_not_stored(disk_cache):
+        recent_end = datetime.now(timezone.utc) - timedelta(minutes=30)
+        disk_cache.put(START, recent_end, False, _merge_requests())
+        assert disk_cache.get(START, recent_end, False) is None
+        count = disk_cache._connection.execute("SELECT COUNT(*) FROM mr_cache").fetchone()[0]
+        assert count == 0
+
+    @staticmethod
+    def test_least_recently_used_evicted(disk_cache, monkeypatch):
+        clock = itertools.count(1000)
+        monkeypatch.setattr(merge_request, "time", SimpleNamespace(time=lambda: next(clock)))
+        windows = [(START + timedelta(days=day), END + timedelta(days=day)) for day in range(3)]
+
+        disk_cache.put(*windows[0], False, _merge_requests())
+        entry_size = disk_cache._connection.execute(
+            "SELECT length(blob) FROM mr_cache").fetchone()[0]
+        disk_cache.max_size = 2 * entry_size
+        disk_cache.put(*windows[1], False, _merge_requests())
+        # Use the first window so that the second is the least recently used.
+        assert disk_cache.get(*windows[0], False) is not None
+        disk_cache.put(*windows[2], False, _merge_requests())
+
+        assert disk_cache.get(*windows[0], False) is not None
+        assert disk_cache.get(*windows[1], False) is None
+        assert disk_cache.get(*windows[2], False) is not None
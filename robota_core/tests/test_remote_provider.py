@@ -0,0 +1,55 @@
+"""Tests for remote_provider.py"""
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from robota_core.remote_provider import RemoteProvider
+
+START = datetime(2020, 1, 1, tzinfo=timezone.utc)
+END = datetime(2020, 2, 1, tzinfo=timezone.utc)
+
+
+class _StaticRemoteProvider(RemoteProvider):
+    """A remote provider with a fixed list of merge requests."""
+    def __init__(self):
+        super().__init__()
+        self.fetch_count = 0
+
+    def _fetch_merge_requests(self, start, end, include_review_comments):
+        self.fetch_count += 1
+        return [SimpleNamespace(number=1, author="anne", state="merged", source_branch="feature",
+                                target_branch="master"),
+                SimpleNamespace(number=2, author="bob", state="opened", source_branch="fix",
+                                target_branch="master")]
+
+    def get_members(self):
+        return {}
+
+    def get_wiki_pages(self):
+        return {}
+
+
+class TestMergeRequestColumns:
+    @staticmethod
+    def test_columns_match_merge_requests():
+        provider = _StaticRemoteProvider()
+        columns = provider.get_merge_request_columns(START, END)
+
+        assert columns == {"number": (1, 2), "author": ("anne", "bob"),
+                           "state": ("merged", "opened"), "source_branch": ("feature", "fix"),
+                           "target_branch": ("master", "master")}
+        merge_requests = provider.get_merge_requests(START, END)
+        assert columns["number"] == tuple(mr.number for mr in merge_requests)
+        # Both views come from the same fetch.
+        assert provider.fetch_count == 1
+
+    @staticmethod
+    def test_columns_updated_when_merge_request_added():
+        provider = _StaticRemoteProvider()
+        assert provider.get_merge_request_columns(START, END)["state"].count("merged") == 1
+
+        cache = provider._get_cached_merge_requests(START, END, False)
+        cache.add_merge_request(SimpleNamespace(number=3, author="anne", state="merged",
+                                                source_branch="docs", target_branch="master"))
+        columns = provider.get_merge_request_columns(START, END)
+        assert columns["number"] == (1, 2, 3)
+        assert columns["state"].count("merged") == 2
@@ -0,0 +1,312 @@
+"""Tests for repository.py"""
+from datetime import datetime, timezone
+import hashlib
+import os
+import pathlib
+import pickle
+import re
+import time
+from types import SimpleNamespace
+
+import git
+
+from robota_core.repository import Branch, GithubRepository, GitlabRepository, LocalRepository, \
+    Repository
+from robota_core.commit import Commit, Tag
+
+
+def _graphql_commit(sha: str) -> dict:
+    return {"oid": sha, "message": "Add tests", "committedDate": "2020-01-02T10:00:00Z",
+            "url": f"https://github.com/owner/name/commit/{sha}",
+            "author": {"name": "Anne Author", "email": "anne@example.com"},
+            "parents": {"nodes": [{"oid": "b" * 40}]},
+            "comments": {"nodes": [{"body": "Looks good", "author": {"name": "Rev Iewer"}},
+                                   {"body": "Deleted user", "author": None}]}}
+
+
+class _StubRequester:
+    """Records GraphQL queries and answers them with canned commits."""
+    def __init__(self, commits: dict):
+        self.commits = commits
+        self.calls = []
+
+    def graphql_query(self, query: str, variables: dict):
+        self.calls.append((query, variables))
+        aliases = re.findall(r'(c\d+): object\(expression: "(\w+)"\)', query)
+        repository = {alias: self.commits.get(sha) for alias, sha in aliases}
+        return {}, {"data": {"repository": repository}}
+
+
+class _StubGithubRepo:
+    full_name = "owner/name"
+
+    def __init__(self, requester: _StubRequester):
+        self._requester = requester
+
+
+class TestGithubCommitsByIds:
+    @staticmethod
+    def test_fetch_commits_by_ids():
+        sha = "a" * 40
+        missing_sha = "f" * 40
+        requester = _StubRequester({sha: _graphql_commit(sha)})
+        repository = GithubRepository.__new__(GithubRepository)
+        repository.repo = _StubGithubRepo(requester)
+
+        commits = repository._fetch_commits_by_ids([sha, missing_sha])
+
+        # The repository must be in the query itself, not in the variables.
+        [(query, variables)] = requester.calls
+        assert variables == {}
+        assert 'repository(owner: "owner", name: "name")' in query
+        assert f'c0: object(expression: "{sha}")' in query
+        assert f'c1: object(expression: "{missing_sha}")' in query
+
+        commit, missing_commit = commits
+        assert missing_commit is None
+        assert commit.id == sha
+        assert commit.short_id == sha[:10]
+        assert commit.created_at == datetime(2020, 1, 2, 10, tzinfo=timezone.utc)
+        assert commit.author_name == "Anne Author"
+        assert commit.email == "anne@example.com"
+        assert commit.parent_ids == ["b" * 40]
+        assert [comment.text for comment in commit.comments] == ["Looks good", "Deleted user"]
+        assert [comment.author for comment in commit.comments] == ["Rev Iewer", None]
+
+
+def _commit_file(repo: git.Repo, name: str, date: str) -> str:
+    """Commit a new file with the given git date, "<unix time> <utc offset>"."""
+    (repo.working_tree_dir / pathlib.Path(name)).write_text(name)
+    repo.index.add([name])
+    author = git.Actor("Anne Author", "anne@example.com")
+    commit = repo.index.commit(f"Add {name}", author=author, committer=author,
+                               author_date=date, commit_date=date)
+    return commit.hexsha
+
+
+class TestCommitDiskCache:
+    @staticmethod
+    def test_commits_reused_until_branch_moves(tmp_path):
+        repo_path = tmp_path / "repo"
+        cache_dir = tmp_path / "cache"
+        repo = git.Repo.init(repo_path, initial_branch="master")
+        first_sha = _commit_file(repo, "a.txt", "1577872800 +0000")
+        source = {"path": str(repo_path), "cache_dir": str(cache_dir)}
+        start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        end = datetime(2020, 1, 2, tzinfo=timezone.utc)
+
+        commits = LocalRepository(source).get_commits(start, end, "master")
+        assert [commit.id for commit in commits] == [first_sha]
+
+        # A new repository object reads the stored commits instead of the repository, so
+        # fetching from the repository would fail here.
+        cached_repository = LocalRepository(source)
+        cached_repository._fetch_commits = None
+        cached_commits = cached_repository.get_commits(start, end, "master")
+        assert [commit.id for commit in cached_commits] == [first_sha]
+        assert cached_commits[0].created_at == commits[0].created_at
+
+        # A commit made within the window but pushed later moves the branch, so the stored
+        # commits are no longer used.
+        second_sha = _commit_file(repo, "b.txt", "1577876400 +0000")
+        commits = LocalRepository(source).get_commits(start, end, "master")
+        assert [commit.id for commit in commits] == [second_sha, first_sha]
+
+    @staticmethod
+    def test_all_branches_not_stored(tmp_path):
+        repo_path = tmp_path / "repo"
+        cache_dir = tmp_path / "cache"
+        repo = git.Repo.init(repo_path, initial_branch="master")
+        _commit_file(repo, "a.txt", "1577872800 +0000")
+        source = {"path": str(repo_path), "cache_dir": str(cache_dir)}
+
+        LocalRepository(source).get_commits(datetime(2020, 1, 1, tzinfo=timezone.utc),
+                                             datetime(2020, 1, 2, tzinfo=timezone.utc))
+        assert not list(cache_dir.iterdir())
+
+    @staticmethod
+    def test_comments_fetched_again(tmp_path):
+        repo_path = tmp_path / "repo"
+        repo = git.Repo.init(repo_path, initial_branch="master")
+        _commit_file(repo, "a.txt", "1577872800 +0000")
+        source = {"path": str(repo_path), "cache_dir": str(tmp_path / "cache")}
+        start = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        end = datetime(2020, 1, 2, tzinfo=timezone.utc)
+
+        repository = LocalRepository(source)
+        fetch_commits = repository._fetch_commits
+
+        def fetch_commits_with_comment(*args):
+            commits = fetch_commits(*args)
+            commits[0].comments = [SimpleNamespace(text="Old comment")]
+            return commits
+
+        repository._fetch_commits = fetch_commits_with_comment
+        assert repository.get_commits(start, end, "master")[0].get_comments() == ["Old comment"]
+
+        # The comments are not stored with the commits...
+        assert LocalRepository(source).get_commits(start, end, "master")[0].comments == []
+        # ...so comments added since the commits were stored are seen by later runs.
+        cached_repository = LocalRepository(source)
+        cached_repository._fetch_commit_comments = \
+            lambda commit_id: [SimpleNamespace(text="Old comment"), SimpleNamespace(text="New")]
+        commits = cached_repository.get_commits(start, end, "master")
+        assert commits[0].get_comments() == ["Old comment", "New"]
+
+    @staticmethod
+    def test_old_files_removed(tmp_path):
+        repo_path = tmp_path / "repo"
+        cache_dir = tmp_path / "cache"
+        git.Repo.init(repo_path, initial_branch="master")
+        cache_dir.mkdir()
+        for name, age_days in [("recent", 1), ("expired", 40)]:
+            path = cache_dir / f"{name}.pkl"
+            path.write_bytes(b"x")
+            used_at = datetime.now().timestamp() - age_days * 24 * 60 * 60
+            os.utime(path, (used_at, used_at))
+
+        LocalRepository({"path": str(repo_path), "cache_dir": str(cache_dir)})
+        assert [path.stem for path in cache_dir.iterdir()] == ["recent"]
+
+
+class _StaticRepository(Repository):
+    """A repository with one branch and one tag."""
+    def _fetch_branches(self):
+        return [Branch({"name": "master", "commit_id": "a" * 40}, "dict")]
+
+    def _fetch_tags(self):
+        return [Tag({"name": "v1", "commit_id": "a" * 40}, "dict")]
+
+
+class TestPrefetch:
+    @staticmethod
+    def test_prefetch_threads_shut_down_when_collected():
+        repository = _StaticRepository("https://example.com/project")
+        assert repository._executor is None
+
+        repository.prefetch()
+        assert repository.get_branch("master").id == "a" * 40
+        assert repository._executor is not None
+        assert repository.get_tag("v1").commit_id == "a" * 40
+        assert repository._executor is None
+
+        # Without live threads the repository can be pickled.
+        assert pickle.loads(pickle.dumps(repository)).get_tag("v1").name == "v1"
+
+
+class TestLocalRefs:
+    @staticmethod
+    def test_get_commit_with_non_commit_tag(tmp_path):
+        repo = git.Repo.init(tmp_path, initial_branch="master")
+        first_sha = _commit_file(repo, "a.txt", "1577872800 +0000")
+        repo.create_tag("v1")
+        second_sha = _commit_file(repo, "b.txt", "1577876400 +0000")
+        # A tag pointing at a blob must not stop branches and other tags being found.
+        blob = repo.head.commit.tree / "a.txt"
+        repo.git.tag("blobtag", blob.hexsha)
+        # A branch takes precedence over a tag with the same name.
+        repo.create_tag("master", ref=first_sha)
+
+        repository = LocalRepository({"path": str(tmp_path)})
+        assert repository._get_commit("master").hexsha == second_sha
+        assert repository._get_commit("v1").hexsha == first_sha
+        assert repository._get_commit(first_sha[:10]).hexsha == first_sha
+
+
+class _FakeGitlabList:
+    """Serves items in pages like a python-gitlab list method, recording the pages requested."""
+    def __init__(self, items: list, report_total_pages: bool = True):
+        self.items = items
+        self.report_total_pages = report_total_pages
+        self.pages_requested = []
+
+    def __call__(self, per_page: int, page: int = 1, iterator: bool = False):
+        if iterator:
+            total_pages = -(-len(self.items) // per_page) if self.report_total_pages else None
+            return _FakeGitlabIterator(self, per_page, total_pages)
+        self.pages_requested.append(page)
+        if page == 2:
+            # Make the second page arrive after the third when fetched concurrently.
+            time.sleep(0.05)
+        return self.items[(page - 1) * per_page:page * per_page]
+
+
+class _FakeGitlabIterator:
+    """Like a python-gitlab RESTObjectList, fetches the next page when the previous one has been
+    iterated over."""
+    def __init__(self, list_method: _FakeGitlabList, per_page: int, total_pages: int):
+        self.list_method = list_method
+        self.per_page = per_page
+        self.total_pages = total_pages
+
+    def __iter__(self):
+        page = 1
+        while True:
+            yield from self.list_method(self.per_page, page)
+            # The server links to the next page only if there is one.
+            if page * self.per_page >= len(self.list_method.items):
+                return
+            page += 1
+
+
+class TestFetchAllPages:
+    @staticmethod
+    def test_pages_fetched_concurrently_in_order():
+        list_method = _FakeGitlabList(list(range(250)))
+        items = GitlabRepository._fetch_all_pages(list_method, per_page=100)
+
+        assert items == list(range(250))
+        # The first page is only requested once, then the remaining pages are requested by
+        # number.
+        assert list_method.pages_requested[0] == 1
+        assert sorted(list_method.pages_requested) == [1, 2, 3]
+
+    @staticmethod
+    def test_single_page():
+        list_method = _FakeGitlabList(list(range(30)))
+        assert GitlabRepository._fetch_all_pages(list_method, per_page=100) == list(range(30))
+        assert list_method.pages_requested == [1]
+
+    @staticmethod
+    def test_pages_fetched_in_turn_without_page_count():
+        list_method = _FakeGitlabList(list(range(250)), report_total_pages=False)
+        items = GitlabRepository._fetch_all_pages(list_method, per_page=100)
+
+        assert items == list(range(250))
+        assert list_method.pages_requested == [1, 2, 3]
+
+
+def _linear_commit_lookup(commits: list, commit_id: str):
+    """Find a commit by full or short SHA by checking each commit in the order fetched."""
+    return next((commit for commit in commits if commit.id.startswith(commit_id)), None)
+
+
+class TestCachedCommitById:
+    @staticmethod
+    def test_matches_linear_search():
+        commits = [Commit({"id": hashlib.sha1(str(number).encode()).hexdigest()}, "dict")
+                   for number in range(200)]
+        repository = _StaticRepository("https://example.com/project")
+        # Indexing in two batches sorts the second batch in with the first.
+        repository._index_commits(commits[:120])
+        repository._index_commits(commits[100:])
+
+        for commit in commits:
+            for commit_id in (commit.id, commit.id[:10], commit.id[:4]):
+                assert repository._get_cached_commit_by_id(commit_id) is \
+                    _linear_commit_lookup(commits, commit_id)
+
+    @staticmethod
+    def test_ambiguous_and_missing_short_ids():
+        commits = [Commit({"id": commit_id}, "dict")
+                   for commit_id in ("ab" + "2" * 38, "ab" + "1" * 38, "cd" + "0" * 38)]
+        repository = _StaticRepository("https://example.com/project")
+        repository._index_commits(commits)
+
+        # An ambiguous short SHA gives the commit that was fetched first, not the lowest SHA.
+        assert repository._get_cached_commit_by_id("ab") is commits[0]
+        assert repository._get_cached_commit_by_id("ab1") is commits[1]
+        # Short SHAs sorted before the first or after the last commit.
+        assert repository._get_cached_commit_by_id("00") is None
+        assert repository._get_cached_commit_by_id("ff") is None
+        assert repository._get_cached_commit_by_id("ce") is None
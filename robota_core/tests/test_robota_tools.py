@@ -25,22 +25,18 @@ class TestGetRobotaConfig:
 class TestReadConfigFile:
     """Test the functions in robota_core.robota_tools._ReadConfigFile"""
     @staticmethod
-    def test_yaml_file_read():
+    def test_yaml_file_read(sample_config_path):
         """Test that a valid yaml file can be read"""
-        test_config_path = TEST_FOLDER / pathlib.Path("config.yaml")
-        config = config_readers.read_yaml_file(test_config_path)
+        config = config_readers.read_yaml_file(sample_config_path)
         assert isinstance(config, dict)
         assert config["Name"] == "Fred"
         assert config["Year"] == 2019
 
     @staticmethod
-    def test_config_parser_valid():
+    def test_config_parser_valid(sample_config):
         """Check the parse_config method with a valid file type"""
-        test_config_path = TEST_FOLDER / pathlib.Path("config.yaml")
-        config = config_readers.parse_config(test_config_path)
-
-        assert config["Name"] == "Fred"
-        assert config["Year"] == 2019
+        assert sample_config["Name"] == "Fred"
+        assert sample_config["Year"] == 2019
 
     @staticmethod
     def test_config_parser_invalid():
@@ -1,7 +1,10 @@
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
-from robota_core.string_processing import string_to_datetime
+from robota_core import string_processing
+from robota_core.string_processing import string_to_datetime, iso_string_to_datetime, \
+    build_regex_string
 
 
 class TestStringProcessing(unittest.TestCase):
@@ -16,3 +19,60 @@ class TestStringProcessing(unittest.TestCase):
 
     def test_string_to_datetime_when_no_string_given(self):
         self.assertEqual(string_to_datetime(None, '%Y-%m-%d'), None)
+
+    def test_string_to_datetime_matches_strptime(self):
+        # Strings in the GitLab format are parsed with fromisoformat, which must give the same
+        # result as strptime.
+        for date, datetime_format in [('2017-06-06T08:28:32.123Z', '%Y-%m-%dT%H:%M:%S.%fZ'),
+                                      ('2017-06-06T08:28:32.1+01:00', '%Y-%m-%dT%H:%M:%S.%f%z'),
+                                      ('2017-06-06T08:28:32.000-0500', '%Y-%m-%dT%H:%M:%S.%f%z'),
+                                      ('2017-06-06T08:28:32.000Z', '%Y-%m-%dT%H:%M:%S.%f%z')]:
+            expected = datetime.strptime(date, datetime_format)
+            if expected.tzinfo is None:
+                expected = expected.replace(tzinfo=string_processing.ZoneInfo("Europe/London"))
+            result = string_to_datetime(date, datetime_format)
+            self.assertEqual(result, expected)
+            self.assertEqual(result.utcoffset(), expected.utcoffset())
+
+    def test_string_to_datetime_other_format(self):
+        self.assertEqual(string_to_datetime('06/12/2017 08:28', '%d/%m/%Y %H:%M'),
+                         datetime(2017, 12, 6, 8, 28, tzinfo=timezone.utc))
+
+    def test_string_to_datetime_rejects_strings_not_matching_format(self):
+        for date, datetime_format in [('2017-12-06T08:28:32Z', '%Y-%m-%dT%H:%M:%S.%fZ'),
+                                      ('2017-12-06T08:28:32Z', None),
+                                      ('2017-12-06 08:28:32.000+01:00', None),
+                                      ('2017-12-06', None)]:
+            with self.assertRaises(ValueError):
+                string_to_datetime(date, datetime_format)
+
+    def test_string_to_datetime_is_cached(self):
+        string_processing._parse_datetime.cache_clear()
+        first = string_to_datetime('2017-11-10T09:08:07.000+00:00')
+        second = string_to_datetime('2017-11-10T09:08:07.000+00:00')
+        self.assertIs(first, second)
+        self.assertEqual(string_processing._parse_datetime.cache_info().hits, 1)
+
+    def test_iso_string_to_datetime_without_fraction(self):
+        self.assertEqual(iso_string_to_datetime('2017-12-06T08:28:32+01:00'),
+                         datetime(2017, 12, 6, 7, 28, 32, tzinfo=timezone.utc))
+
+    def test_iso_string_to_datetime_with_z_suffix(self):
+        self.assertEqual(iso_string_to_datetime('2017-12-06T08:28:32.000Z'),
+                         datetime(2017, 12, 6, 8, 28, 32, tzinfo=timezone.utc))
+
+    def test_iso_string_to_datetime_with_offset(self):
+        self.assertEqual(iso_string_to_datetime('2017-11-10T09:08:07.000+00:00'),
+                         datetime(2017, 11, 10, 9, 8, 7, tzinfo=timezone.utc))
+
+    def test_markdownify_and_clean_from_threads(self):
+        texts = [f"**bold {number}** <script>{number}</script>" for number in range(200)]
+        expected = [string_processing.clean(string_processing.markdownify(text))
+                    for text in texts]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(
+                lambda text: string_processing.clean(string_processing.markdownify(text)), texts))
+        self.assertEqual(results, expected)
+
+    def test_build_regex_string(self):
+        self.assertEqual(build_regex_string('src/*.py?'), r'src/.+\.py.')